@@ -0,0 +1,164 @@
+"""Process-wide admission control for new media streams.
+
+Every ``/media-stream`` connection asks ``AdmissionController.admit`` before it
+opens an upstream session.  The controller looks at:
+
+* concurrent sessions, process-wide and per profile;
+* event-loop lag, from the loop monitor;
+* upstream headroom: the latest ``rate_limits.updated`` state reported by any
+  session (the limits belong to the API key, so the newest report wins), as
+  the smallest ``remaining / limit`` across limits that have not reset yet.
+
+When there is headroom the call is admitted at once.  Otherwise it waits in a
+short bounded queue for headroom to come back and is rejected (``Rejected``)
+when the queue is full or the wait times out, so the bridge can close the
+stream cleanly instead of letting the call sit silent.  Every decision is
+counted under ``admission.*``.  Profiles can override the limits with an
+``admission`` block.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LIMIT_KEYS = ('max_loop_lag_ms', 'min_headroom', 'queue_timeout_s', 'max_queue')
+RECHECK_INTERVAL_S = 0.1  # loop lag and rate-limit resets change without a notification
+
+
+class Rejected(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(self, max_sessions=0, max_loop_lag_ms=0, min_headroom=0.0, queue_timeout_s=0.0,
+                 max_queue=0, lag_ms=None):
+        self.max_sessions = max_sessions        # 0 = unlimited
+        self.max_loop_lag_ms = max_loop_lag_ms  # 0 = ignore loop lag
+        self.min_headroom = min_headroom        # fraction of the tightest rate limit left
+        self.queue_timeout_s = queue_timeout_s
+        self.max_queue = max_queue
+        self.lag_ms = lag_ms or (lambda: 0.0)
+        self.active = 0
+        self.active_by_profile = Counter()
+        self.waiting = 0
+        self.rate_limits = {}
+        self._changed = asyncio.Event()  # replaced on every notification
+
+    def update_rate_limits(self, rate_limits):
+        """Fold in the ``rate_limits`` list of a ``rate_limits.updated`` event."""
+        now = time.monotonic()
+        for entry in rate_limits or ():
+            name = entry.get('name')
+            if not name or not entry.get('limit'):
+                continue
+            self.rate_limits[name] = {
+                'limit': entry['limit'],
+                'remaining': entry.get('remaining', entry['limit']),
+                'reset_at': now + float(entry.get('reset_seconds') or 0),
+            }
+        metrics.set_gauge('admission.headroom', self.headroom())
+        self._notify()
+
+    def headroom(self):
+        """Smallest remaining fraction across rate limits that have not reset."""
+        now = time.monotonic()
+        fractions = [state['remaining'] / state['limit'] for state in self.rate_limits.values()
+                     if state['reset_at'] > now]
+        return round(min(fractions), 4) if fractions else 1.0
+
+    def limits_for(self, profile):
+        overrides = (profile or {}).get('admission') or {}
+        return {key: overrides.get(key, getattr(self, key)) for key in LIMIT_KEYS}
+
+    def _blocked(self, profile, limits):
+        """Return the reason a new session cannot start now, or None."""
+        if self.max_sessions and self.active >= self.max_sessions:
+            return 'sessions'
+        profile_max = ((profile or {}).get('admission') or {}).get('max_sessions')
+        if profile_max and self.active_by_profile[profile.get('name')] >= profile_max:
+            return 'profile_sessions'
+        if limits['max_loop_lag_ms'] and self.lag_ms() > limits['max_loop_lag_ms']:
+            return 'loop_lag'
+        if limits['min_headroom'] and self.headroom() < limits['min_headroom']:
+            return 'rate_limit'
+        return None
+
+    async def _wait_for_headroom(self, profile, limits):
+        deadline = time.monotonic() + limits['queue_timeout_s']
+        reason = self._blocked(profile, limits)
+        while reason is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return reason
+            try:
+                await asyncio.wait_for(self._changed.wait(), min(remaining, RECHECK_INTERVAL_S))
+            except asyncio.TimeoutError:
+                pass
+            reason = self._blocked(profile, limits)
+        return None
+
+    @asynccontextmanager
+    async def admit(self, profile=None):
+        """Hold an admission slot for the session; raise ``Rejected`` without headroom."""
+        limits = self.limits_for(profile)
+        reason = self._blocked(profile, limits)
+        if reason is not None:
+            if self.waiting >= limits['max_queue'] or limits['queue_timeout_s'] <= 0:
+                self._reject(reason, queued=False)
+            started = time.perf_counter()
+            self.waiting += 1
+            metrics.inc('admission.queued')
+            metrics.set_gauge('admission.waiting', self.waiting)
+            try:
+                reason = await self._wait_for_headroom(profile, limits)
+            finally:
+                self.waiting -= 1
+                metrics.set_gauge('admission.waiting', self.waiting)
+                metrics.observe('admission.wait_ms', (time.perf_counter() - started) * 1000)
+            if reason is not None:
+                self._reject(reason, queued=True)
+
+        name = (profile or {}).get('name')
+        self.active += 1
+        self.active_by_profile[name] += 1
+        metrics.inc('admission.admitted')
+        metrics.set_gauge('admission.active', self.active)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.active_by_profile[name] -= 1
+            if not self.active_by_profile[name]:
+                del self.active_by_profile[name]
+            metrics.set_gauge('admission.active', self.active)
+            self._notify()
+
+    def _reject(self, reason, queued):
+        metrics.inc(f'admission.rejected.{reason}')
+        logger.warning(f"Rejecting new session: {reason} ({'after queueing' if queued else 'no queue space'}); "
+                       f"active={self.active} lag={self.lag_ms():.0f}ms headroom={self.headroom()}")
+        raise Rejected(reason)
+
+    def _notify(self):
+        if self.waiting:
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+    def snapshot(self):
+        return {
+            'active': self.active,
+            'active_by_profile': dict(self.active_by_profile),
+            'waiting': self.waiting,
+            'headroom': self.headroom(),
+            'loop_lag_ms': round(self.lag_ms(), 1),
+            'rate_limits': {name: {k: v for k, v in state.items() if k != 'reset_at'}
+                            for name, state in self.rate_limits.items()},
+            'limits': dict(self.limits_for(None), max_sessions=self.max_sessions),
+        }
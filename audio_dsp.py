@@ -0,0 +1,358 @@
+"""G.711 mu-law helpers and the inbound and outbound DSP stages for the media bridge.
+
+Twilio media streams carry 8 kHz mono mu-law, and the upstream session is
+configured for the same format, so the bridge never has to transcode unless a
+stage asks for it.  ``OutputDSP`` applies the per-call ``volume`` and
+``speech_rate`` settings to the model's audio before it reaches Twilio:
+
+* volume is a 256-entry translation table per gain value (decode, gain, soft
+  limit, re-encode), so plain gain costs one ``bytes.translate`` per delta;
+* speech rate is a streaming WSOLA time-stretch on the decoded samples, which
+  changes tempo without shifting pitch and keeps its state across deltas.
+
+``build_output_dsp`` returns None for identity settings so the bridge forwards
+deltas untouched.
+
+``InputDSP`` is the optional inbound stage for quiet or noisy PSTN audio.  It
+decodes each 20 ms frame and runs spectral-subtraction noise suppression
+(50%-overlapped 40 ms sqrt-Hann STFT, per-bin noise tracking, over-subtraction
+with a spectral floor) and AGC (gain ramped across the block, held through
+silence, soft-limited), then re-encodes.  State carries across frames.  Noise
+suppression adds exactly one frame (20 ms) of latency; AGC alone adds none.
+"""
+import math
+from functools import lru_cache
+
+import numpy as np
+
+SAMPLE_RATE = 8000
+FRAME_SAMPLES = 160  # 20 ms at 8 kHz
+
+_BIAS = 0x84
+_CLIP = 32635
+_EXP_LUT = bytes(min(7, max(0, i.bit_length() - 1)) if i else 0 for i in range(256))
+
+
+def ulaw_to_linear(code):
+    """Decode one mu-law byte to a 16-bit linear sample."""
+    code = ~code & 0xFF
+    sign = code & 0x80
+    exponent = (code >> 4) & 0x07
+    magnitude = (((code & 0x0F) << 3) + _BIAS) << exponent
+    magnitude -= _BIAS
+    return -magnitude if sign else magnitude
+
+
+def linear_to_ulaw(sample):
+    """Encode one 16-bit linear sample to a mu-law byte."""
+    sign = 0x80 if sample < 0 else 0
+    magnitude = min(abs(int(sample)), _CLIP) + _BIAS
+    exponent = _EXP_LUT[(magnitude >> 7) & 0xFF]
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return ~(sign | (exponent << 4) | mantissa) & 0xFF
+
+
+ULAW_TO_LINEAR = tuple(ulaw_to_linear(code) for code in range(256))
+ULAW_TO_FLOAT = np.array(ULAW_TO_LINEAR, dtype=np.float32) / 32768.0
+_EXP_LUT_NP = np.frombuffer(_EXP_LUT, dtype=np.uint8).astype(np.int32)
+
+
+def decode_ulaw(raw):
+    """Decode mu-law bytes to float32 samples in [-1, 1)."""
+    return ULAW_TO_FLOAT[np.frombuffer(raw, dtype=np.uint8)]
+
+
+def encode_ulaw(samples):
+    """Encode float samples in [-1, 1) to mu-law bytes."""
+    linear = np.clip(np.asarray(samples) * 32768.0, -32768, 32767).astype(np.int32)
+    sign = np.where(linear < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(linear), _CLIP) + _BIAS
+    exponent = _EXP_LUT_NP[(magnitude >> 7) & 0xFF]
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+def soft_limit(x, knee=0.7):
+    """Pass samples below ``knee`` untouched and compress peaks smoothly towards 1.0."""
+    magnitude = abs(x)
+    if magnitude <= knee:
+        return x
+    span = 1.0 - knee
+    limited = knee + span * math.tanh((magnitude - knee) / span)
+    return limited if x > 0 else -limited
+
+
+def soft_limit_array(x, knee=0.7):
+    """Vectorized ``soft_limit``."""
+    magnitude = np.abs(x)
+    over = magnitude > knee
+    if not over.any():
+        return x
+    span = 1.0 - knee
+    limited = knee + span * np.tanh((magnitude - knee) / span)
+    return np.where(over, np.copysign(limited, x), x)
+
+
+@lru_cache(maxsize=64)
+def gain_table(gain):
+    """Return the 256-byte mu-law translation table for ``gain``."""
+    return bytes(
+        linear_to_ulaw(round(soft_limit(ULAW_TO_LINEAR[code] / 32768.0 * gain) * 32767))
+        for code in range(256)
+    )
+
+
+class WsolaStretcher:
+    """Streaming pitch-preserving time-stretch (WSOLA) for 8 kHz samples.
+
+    ``rate`` > 1 speaks faster.  Each call to ``process`` consumes whatever
+    input is available and returns the output samples that are final; the
+    algorithm needs ``window + 2 * tolerance`` samples of lookahead, which is
+    about 48 ms with the defaults (up to ``hop`` more when slowing down, as
+    the template then runs ahead of the analysis position).
+    """
+
+    def __init__(self, rate, window=256, tolerance=64):
+        self.rate = rate
+        self.window = window
+        self.hop = window // 2
+        self.tolerance = tolerance
+        # Periodic Hann windows at 50% overlap sum to exactly one
+        self._win = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(window) / window)).astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self._input = np.zeros(self.tolerance, dtype=np.float32)
+        self._pos = float(self.tolerance)  # next analysis position in _input
+        self._prev = None                  # start of the last frame taken from _input
+        self._overlap = np.zeros(self.window, dtype=np.float32)
+
+    def process(self, samples):
+        if len(samples):
+            self._input = np.concatenate((self._input, samples.astype(np.float32, copy=False)))
+        out = []
+        analysis_hop = self.hop * self.rate
+        while True:
+            pos = int(self._pos)
+            if pos + self.tolerance + self.window > len(self._input):
+                break
+            if self._prev is None:
+                start = pos
+            else:
+                # Below rate 1 the template can run past the analysis region;
+                # wait until it is fully buffered
+                if self._prev + self.hop + self.window > len(self._input):
+                    break
+                # Pick the frame near pos that best continues the previous one
+                template = self._input[self._prev + self.hop:self._prev + self.hop + self.window]
+                region = self._input[pos - self.tolerance:pos + self.tolerance + self.window]
+                score = np.correlate(region, template, mode='valid')
+                start = pos - self.tolerance + min(int(np.argmax(score)), 2 * self.tolerance)
+            self._overlap += self._win * self._input[start:start + self.window]
+            out.append(self._overlap[:self.hop].copy())
+            self._overlap = np.concatenate((self._overlap[self.hop:], np.zeros(self.hop, dtype=np.float32)))
+            self._prev = start
+            self._pos += analysis_hop
+            self._trim()
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+    def flush(self):
+        """Drain buffered audio at the end of a response."""
+        pending = len(self._input) - int(self._pos)
+        if pending <= 0 and self._prev is None:
+            self.reset()
+            return np.zeros(0, dtype=np.float32)
+        padding = np.zeros(self.window + 2 * self.tolerance + self.hop, dtype=np.float32)
+        out = self.process(padding)
+        # Keep only the stretched share of the real input plus the final overlap
+        keep = max(0, int(pending / self.rate))
+        tail = np.concatenate((out, self._overlap[:self.hop]))[:keep + self.hop]
+        self.reset()
+        return tail
+
+    def _trim(self):
+        keep_from = int(self._pos) - self.tolerance
+        if self._prev is not None:
+            keep_from = min(keep_from, self._prev + self.hop)
+        if keep_from > 4 * self.window:
+            self._input = self._input[keep_from:]
+            self._pos -= keep_from
+            self._prev -= keep_from
+
+
+class OutputDSP:
+    """Per-call outbound stage applying ``volume`` and ``speech_rate`` to mu-law deltas."""
+
+    def __init__(self, volume=1.0, speech_rate=1.0):
+        self.volume = volume
+        self.speech_rate = speech_rate
+        self._table = gain_table(round(volume, 2)) if volume != 1.0 else None
+        self._stretcher = WsolaStretcher(speech_rate) if speech_rate != 1.0 else None
+        if self._stretcher is not None:
+            # Fold the gain into the decode table so stretching pays for it once
+            table = np.frombuffer(self._table or bytes(range(256)), dtype=np.uint8)
+            self._decode = ULAW_TO_FLOAT[table]
+
+    @property
+    def identity(self):
+        return self._table is None and self._stretcher is None
+
+    @property
+    def buffered_bytes(self):
+        """Memory held in the stretcher between deltas."""
+        if self._stretcher is None:
+            return 0
+        return self._stretcher._input.nbytes + self._stretcher._overlap.nbytes
+
+    def process(self, raw):
+        """Transform one mu-law delta; may return fewer or more bytes than given."""
+        if self._stretcher is None:
+            return raw.translate(self._table) if self._table else raw
+        samples = self._decode[np.frombuffer(raw, dtype=np.uint8)]
+        return encode_ulaw(self._stretcher.process(samples))
+
+    def flush(self):
+        """Return any audio still buffered at the end of a response."""
+        if self._stretcher is None:
+            return b''
+        return encode_ulaw(self._stretcher.flush())
+
+    def reset(self):
+        """Drop buffered audio, e.g. when the caller barges in."""
+        if self._stretcher is not None:
+            self._stretcher.reset()
+
+
+def build_output_dsp(volume=1.0, speech_rate=1.0):
+    """Return an ``OutputDSP`` for the settings, or None when they are identity."""
+    volume = min(max(float(volume), 0.0), 2.0)
+    speech_rate = min(max(float(speech_rate), 0.5), 2.0)
+    if abs(volume - 1.0) < 0.005 and abs(speech_rate - 1.0) < 0.005:
+        return None
+    return OutputDSP(
+        volume=volume if abs(volume - 1.0) >= 0.005 else 1.0,
+        speech_rate=speech_rate if abs(speech_rate - 1.0) >= 0.005 else 1.0
+    )
+
+
+LEVEL_BUCKETS_DBFS = (-70, -60, -50, -40, -35, -30, -25, -20, -15, -10, -5, 0)
+
+
+def level_dbfs(samples):
+    return 10 * math.log10(float(np.mean(samples * samples)) + 1e-10)
+
+
+class InputDSP:
+    """Per-call inbound stage: spectral-subtraction noise suppression and AGC on mu-law frames."""
+
+    def __init__(self, noise_suppression=True, agc=True, agc_target_dbfs=-20.0, agc_max_gain_db=20.0,
+                 agc_min_gain_db=-10.0, gate_dbfs=-50.0, speech_margin_db=6.0, over_subtraction=2.0,
+                 spectral_floor=0.05):
+        self.noise_suppression = noise_suppression
+        self.agc = agc
+        self.agc_target_dbfs = agc_target_dbfs
+        self.agc_max_gain_db = agc_max_gain_db
+        self.agc_min_gain_db = agc_min_gain_db
+        self.gate_dbfs = gate_dbfs
+        self.speech_margin_db = speech_margin_db
+        self.over_subtraction = over_subtraction
+        self.spectral_floor = spectral_floor
+        n = 2 * FRAME_SAMPLES
+        self._window = np.sqrt(np.hanning(n + 1)[:-1]).astype(np.float32)  # periodic; squares sum to 1 at 50%
+        self._noise_rise = 10 ** (3.0 / 10 * FRAME_SAMPLES / SAMPLE_RATE)  # noise estimate may rise 3 dB/s
+        self._previous = np.zeros(FRAME_SAMPLES, dtype=np.float32)
+        self._tail = np.zeros(FRAME_SAMPLES, dtype=np.float32)
+        self._noise = None
+        self._smoothed = None
+        self._floor_db = None
+        self._bin_gains = np.ones(n // 2 + 1, dtype=np.float32)
+        self._pending = b''
+        self.gain_db = 0.0
+        self.blocks = 0
+        self._active_blocks = 0
+        self._in_power = 0.0
+        self._out_power = 0.0
+
+    def process(self, raw):
+        """Process mu-law bytes; returns the same amount of audio once primed (20 ms behind with NS)."""
+        if self._pending:
+            raw = self._pending + raw
+        usable = len(raw) - len(raw) % FRAME_SAMPLES
+        self._pending = raw[usable:]
+        if not usable:
+            return b''
+        blocks = ULAW_TO_FLOAT[np.frombuffer(raw, dtype=np.uint8, count=usable)].reshape(-1, FRAME_SAMPLES)
+        return encode_ulaw(np.concatenate([self._block(block) for block in blocks]))
+
+    def _block(self, x):
+        self.blocks += 1
+        in_power = float(np.mean(x * x))
+        speech = self._is_speech(10 * math.log10(in_power + 1e-10))
+        y = self._suppress(x) if self.noise_suppression else x
+        if self.agc:
+            y = self._gain(y, speech)
+        if speech:
+            self._active_blocks += 1
+            self._in_power += in_power
+            self._out_power += float(np.mean(y * y))
+        return y
+
+    def _is_speech(self, level):
+        """Compare the block with the broadband noise floor (fast to fall, 2 dB/s to rise)."""
+        floor = self._floor_db
+        if floor is None:
+            self._floor_db = level
+        elif level < floor:
+            self._floor_db += 0.3 * (level - floor)
+        else:
+            self._floor_db += min(level - floor, 2.0 * FRAME_SAMPLES / SAMPLE_RATE)
+        return level > self.gate_dbfs and (floor is None or level > floor + self.speech_margin_db)
+
+    def _suppress(self, x):
+        spectrum = np.fft.rfft(np.concatenate((self._previous, x)) * self._window)
+        self._previous = x
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        if self._noise is None:
+            self._noise = self._smoothed = power
+        else:
+            # Average bins that look like noise; let the estimate creep up only slowly under speech
+            self._smoothed = 0.6 * self._smoothed + 0.4 * power
+            self._noise = np.where(self._smoothed < 4.0 * self._noise, 0.9 * self._noise + 0.1 * self._smoothed,
+                                   self._noise * self._noise_rise)
+        gains = np.sqrt(np.maximum(1.0 - self.over_subtraction * self._noise / (power + 1e-12),
+                                   self.spectral_floor))
+        # Smooth gains over time to keep musical noise down
+        self._bin_gains = 0.4 * self._bin_gains + 0.6 * gains
+        frame = np.fft.irfft(spectrum * self._bin_gains, n=2 * FRAME_SAMPLES).astype(np.float32) * self._window
+        out = self._tail + frame[:FRAME_SAMPLES]
+        self._tail = frame[FRAME_SAMPLES:]
+        return out
+
+    def _gain(self, y, speech):
+        level = level_dbfs(y)
+        target = self.gain_db
+        if speech:  # hold the gain through pauses instead of boosting noise
+            target = min(max(self.agc_target_dbfs - level, self.agc_min_gain_db), self.agc_max_gain_db)
+        rate = 0.3 if target < self.gain_db else 0.05  # fast attack, slow release
+        new_gain_db = self.gain_db + rate * (target - self.gain_db)
+        ramp = 10 ** (np.linspace(self.gain_db, new_gain_db, len(y), dtype=np.float32) / 20)
+        self.gain_db = new_gain_db
+        return soft_limit_array(y * ramp)
+
+    def levels(self):
+        """Mean level of speech-active blocks before and after the stage."""
+        active = self._active_blocks
+        return {
+            'blocks': self.blocks,
+            'active_blocks': active,
+            'input_level_dbfs': round(10 * math.log10(self._in_power / active), 1) if active else None,
+            'output_level_dbfs': round(10 * math.log10(self._out_power / active + 1e-10), 1) if active else None,
+            'agc_gain_db': round(self.gain_db, 1),
+        }
+
+
+def build_input_dsp(noise_suppression=False, agc=False, **options):
+    """Return an ``InputDSP`` with the enabled stages, or None when both are off."""
+    if not noise_suppression and not agc:
+        return None
+    return InputDSP(noise_suppression=bool(noise_suppression), agc=bool(agc), **options)
@@ -0,0 +1,248 @@
+"""Shared worker pools for CPU-bound per-call audio work.
+
+Every bridge runs on the one event loop, so DSP, transcoding and recording
+encodes done inline delay every other call's frames.  ``AudioWorkers`` moves
+that work off the loop:
+
+* jobs are submitted under a *lane* (one per call and direction); a lane always
+  maps to the same single-worker shard and a shard runs one batch at a time, so
+  jobs of a lane run in submission order and per-lane state needs no locks;
+* jobs queued on a shard while its previous batch runs (or in the same loop
+  iteration) go out as one executor submission, so 20 ms frames from many
+  calls cost one hand-off instead of one each;
+* ``pool='thread'`` shards are threads, for NumPy work that releases the GIL
+  or is cheap to hand over; ``pool='process'`` shards are single-worker
+  processes for pure-Python work that would hold the GIL, with batch payloads
+  and results passed through a per-shard shared-memory segment instead of
+  being pickled.
+
+Job functions are called as ``fn(state, data, *args)`` in the worker, where
+``state`` is a dict kept per lane in that worker until ``release``.
+``stage`` wraps a stateful object (``InputDSP``, ``OutputDSP``) so its methods
+run in the lane's worker.  With no threads configured everything runs inline.
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+POOLS = ('thread', 'process')
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+_process_states = {}    # lane -> state, inside a process worker
+_process_segments = {}  # shared-memory name -> attached segment, inside a process worker
+
+
+def _release(state, data):
+    state.clear()
+
+
+def _call_stage(state, data, method, obj=None):
+    if obj is not None:
+        state['stage'] = obj
+    stage = state['stage']
+    return getattr(stage, method)() if data is None else getattr(stage, method)(data)
+
+
+def _run_jobs(states, jobs):
+    """Run ``(lane, fn, data, args)`` jobs in order; one failure does not stop the batch."""
+    results = []
+    for lane, fn, data, args in jobs:
+        try:
+            state = states.setdefault(lane, {})
+            results.append((True, fn(state, data, *args)))
+            if fn is _release:
+                del states[lane]
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+def _segment(name):
+    segment = _process_segments.get(name)
+    if segment is None:
+        # Spawned workers share the parent's resource tracker, which unlinks it once, at stop()
+        segment = _process_segments[name] = shared_memory.SharedMemory(name=name)
+    return segment
+
+
+def _run_process_batch(in_name, out_name, jobs):
+    """Process-worker entry point: payloads and bytes results travel through shared memory."""
+    in_buf, out_buf = _segment(in_name).buf, _segment(out_name).buf
+    resolved = [(lane, fn, bytes(in_buf[data[0]:data[0] + data[1]]) if isinstance(data, tuple) else data, args)
+                for lane, fn, data, args in jobs]
+    results, offset = [], 0
+    for ok, value in _run_jobs(_process_states, resolved):
+        if ok and isinstance(value, bytes) and offset + len(value) <= len(out_buf):
+            out_buf[offset:offset + len(value)] = value
+            value = (offset, len(value))
+            offset += value[1]
+            ok = 'shm'
+        results.append((ok, value))
+    return results
+
+
+def _noop():
+    return None
+
+
+class _Shard:
+    def __init__(self, workers, executor, segment_bytes=0):
+        self.workers = workers
+        self.executor = executor
+        self.states = {}  # lane -> state, for thread shards
+        self.pending = []
+        self.busy = False
+        self.scheduled = False
+        self.segments = None
+        if segment_bytes:
+            self.segments = (shared_memory.SharedMemory(create=True, size=segment_bytes),
+                             shared_memory.SharedMemory(create=True, size=segment_bytes))
+
+    def enqueue(self, job):
+        self.pending.append(job)
+        if not self.busy and not self.scheduled:
+            # Let the rest of this loop iteration add to the batch
+            self.scheduled = True
+            asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _dispatch(self):
+        self.scheduled = False
+        if self.busy or not self.pending:
+            return
+        batch = self.pending[:self.workers.max_batch]
+        del self.pending[:len(batch)]
+        batch = [job for job in batch if not job[4].cancelled()]
+        if not batch:
+            return self._dispatch()
+        self.busy = True
+        metrics.histogram('audio_workers.batch_size', BATCH_BUCKETS).observe(len(batch))
+        loop = asyncio.get_running_loop()
+        if self.segments is None:
+            jobs = [job[:4] for job in batch]
+            future = loop.run_in_executor(self.executor, _run_jobs, self.states, jobs)
+        else:
+            jobs, offset = [], 0
+            in_buf = self.segments[0].buf
+            for lane, fn, data, args, _, _ in batch:
+                if data and offset + len(data) <= len(in_buf):
+                    in_buf[offset:offset + len(data)] = data
+                    data, offset = (offset, len(data)), offset + len(data)
+                jobs.append((lane, fn, data, args))
+            future = loop.run_in_executor(self.executor, _run_process_batch,
+                                          self.segments[0].name, self.segments[1].name, jobs)
+        future.add_done_callback(lambda f: self._complete(batch, f))
+
+    def _complete(self, batch, future):
+        self.busy = False
+        try:
+            results = future.result()
+        except BaseException as e:  # the worker itself died; fail the whole batch
+            results = [(False, e if isinstance(e, Exception) else RuntimeError(repr(e)))] * len(batch)
+        out_buf = self.segments[1].buf if self.segments else None
+        now = time.perf_counter()
+        for (_, _, _, _, waiter, submitted), (ok, value) in zip(batch, results):
+            if ok == 'shm':
+                value = bytes(out_buf[value[0]:value[0] + value[1]])
+            if waiter.cancelled():
+                continue
+            if ok:
+                waiter.set_result(value)
+            else:
+                metrics.inc('audio_workers.errors')
+                waiter.set_exception(value)
+            metrics.observe('audio_workers.job_ms', (now - submitted) * 1000)
+        self._dispatch()
+
+    def close(self):
+        for segment in self.segments or ():
+            segment.close()
+            segment.unlink()
+
+
+class Stage:
+    """A stateful per-call object whose methods run in its lane's worker."""
+
+    def __init__(self, workers, lane, obj, pool='thread'):
+        self.workers = workers
+        self.lane = lane
+        self.pool = pool
+        self._obj = obj  # shipped with the first call
+
+    def call(self, method, data=None):
+        """Run ``obj.method(data)`` (or ``obj.method()`` without data); returns a future."""
+        obj, self._obj = self._obj, None
+        return self.workers.submit(self.lane, _call_stage, data, method, obj, pool=self.pool)
+
+    async def close(self):
+        """Drop the worker-side state once the lane's queued calls have run."""
+        await self.workers.release(self.lane, pool=self.pool)
+
+
+class AudioWorkers:
+    def __init__(self, threads=2, processes=0, max_batch=64, segment_bytes=1 << 20):
+        self.threads = threads
+        self.processes = processes
+        self.max_batch = max_batch
+        self.segment_bytes = segment_bytes
+        self.shards = {pool: [] for pool in POOLS}
+        self._executors = []
+        self._inline_states = {}
+
+    async def start(self):
+        for _ in range(self.threads):
+            executor = ThreadPoolExecutor(1, thread_name_prefix='audio-worker')
+            self._executors.append(executor)
+            self.shards['thread'].append(_Shard(self, executor))
+        context = multiprocessing.get_context('spawn')  # forking a threaded server is unsafe
+        for _ in range(self.processes):
+            executor = ProcessPoolExecutor(1, mp_context=context)
+            self._executors.append(executor)
+            self.shards['process'].append(_Shard(self, executor, self.segment_bytes))
+        # Spawn the processes now rather than on the loop at the first call's first frame
+        await asyncio.gather(*(asyncio.wrap_future(executor.submit(_noop)) for executor in self._executors))
+        if self._executors:
+            logger.info(f"Audio workers started ({self.threads} threads, {self.processes} processes)")
+
+    async def stop(self):
+        for executor in self._executors:
+            await asyncio.to_thread(executor.shutdown, cancel_futures=True)
+        for shard in self.shards['process']:
+            shard.close()
+        self._executors = []
+        self.shards = {pool: [] for pool in POOLS}
+
+    def _shard(self, lane, pool):
+        # Process jobs fall back to threads, and threads to inline, when not configured
+        shards = self.shards[pool] or self.shards['thread']
+        return shards[hash(lane) % len(shards)] if shards else None
+
+    def submit(self, lane, fn, data=b'', *args, pool='thread'):
+        """Queue ``fn(state, data, *args)`` on the lane's shard; returns a future."""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        metrics.inc('audio_workers.jobs')
+        shard = self._shard(lane, pool)
+        if shard is None:
+            ok, value = _run_jobs(self._inline_states, [(lane, fn, data, args)])[0]
+            waiter.set_result(value) if ok else waiter.set_exception(value)
+        else:
+            shard.enqueue((lane, fn, data, args, waiter, time.perf_counter()))
+        return waiter
+
+    def stage(self, lane, obj, pool='thread'):
+        return Stage(self, lane, obj, pool)
+
+    def release(self, lane, pool='thread'):
+        """Drop a lane's worker-side state after its queued jobs."""
+        return self.submit(lane, _release, pool=pool)
+
+    def snapshot(self):
+        return {pool: [{'pending': len(s.pending), 'busy': s.busy, 'lanes': len(s.states)} for s in shards]
+                for pool, shards in self.shards.items()}
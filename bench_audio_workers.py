@@ -0,0 +1,135 @@
+"""Benchmark: event-loop lag as per-call DSP load grows, inline versus the audio workers.
+
+Each simulated call sends a 20 ms μ-law frame every 20 ms through a per-call
+stage and awaits the result, the way ``receive_from_twilio`` does.  For every
+pool and call count a ticker measures loop lag while the calls run:
+
+* ``--stage dsp``    - ``InputDSP`` with noise suppression and AGC (NumPy);
+* ``--stage python`` - a per-sample pure-Python decode/gain/encode, the kind of
+  GIL-bound work the process pool is for.
+
+    python bench_audio_workers.py --calls 10,50,100,200 --pools inline,thread,process --stage dsp
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+import numpy as np
+
+from audio_dsp import FRAME_SAMPLES, InputDSP, encode_ulaw, linear_to_ulaw, ulaw_to_linear
+from audio_workers import AudioWorkers
+
+FRAME_S = FRAME_SAMPLES / 8000
+
+
+def python_gain(state, data, gain):
+    """Pure-Python gain on μ-law bytes; holds the GIL for the whole frame."""
+    return bytes(linear_to_ulaw(max(-32768, min(32767, ulaw_to_linear(code) * gain))) for code in data)
+
+
+def test_frames(count=50):
+    rng = np.random.default_rng(0)
+    t = np.arange(count * FRAME_SAMPLES) / 8000
+    audio = encode_ulaw(0.05 * np.sin(2 * np.pi * 220 * t) + 0.005 * rng.standard_normal(len(t)))
+    return [audio[i:i + FRAME_SAMPLES] for i in range(0, len(audio), FRAME_SAMPLES)]
+
+
+def _percentiles(values):
+    if not values:
+        return None, None, None
+    ordered = sorted(values)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+    return round(pick(50), 2), round(pick(99), 2), round(ordered[-1], 2)
+
+
+async def run_level(workers, calls, seconds, stage_kind, frames):
+    loop = asyncio.get_running_loop()
+    pool = 'process' if workers.processes else 'thread'
+    end = loop.time() + seconds
+    lags, latencies, late = [], [], 0
+
+    async def ticker():
+        interval = 0.01
+        while loop.time() < end:
+            scheduled = loop.time()
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, (loop.time() - scheduled - interval) * 1000))
+
+    async def call(index):
+        nonlocal late
+        lane = f"bench-{index}"
+        stage = workers.stage(lane, InputDSP(), pool=pool) if stage_kind == 'dsp' else None
+        deadline = loop.time() + FRAME_S * index / calls  # spread frame phases across calls
+        n = 0
+        while deadline < end:
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            started = time.perf_counter()
+            frame = frames[n % len(frames)]
+            if stage:
+                await stage.call('process', frame)
+            else:
+                await workers.submit(lane, python_gain, frame, 2, pool=pool)
+            elapsed = time.perf_counter() - started
+            latencies.append(elapsed * 1000)
+            late += elapsed > FRAME_S
+            n += 1
+            deadline += FRAME_S
+        await workers.release(lane, pool=pool)
+
+    await asyncio.gather(ticker(), *(call(i) for i in range(calls)))
+    return {
+        'lag_ms': _percentiles(lags),
+        'job_ms': _percentiles(latencies),
+        'frames': len(latencies),
+        'late': late,
+    }
+
+
+async def bench(args):
+    frames = test_frames()
+    rows = []
+    for pool in args.pools:
+        workers = AudioWorkers(
+            threads=0 if pool == 'inline' else args.workers,
+            processes=args.workers if pool == 'process' else 0,
+            max_batch=args.max_batch
+        )
+        await workers.start()
+        try:
+            for calls in args.calls:
+                result = await run_level(workers, calls, args.seconds, args.stage, frames)
+                rows.append((pool, calls, result))
+                lag, job = result['lag_ms'], result['job_ms']
+                print(f"{pool:<8} {calls:>6} {lag[0]:>9} {lag[1]:>9} {lag[2]:>9} {job[0]:>9} {job[1]:>9} "
+                      f"{result['frames']:>8} {result['late']:>6}", flush=True)
+        finally:
+            await workers.stop()
+    return rows
+
+
+def _ints(text):
+    return [int(v) for v in text.split(',') if v]
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Loop lag under per-call DSP load, inline vs audio workers")
+    parser.add_argument('--calls', type=_ints, default=[10, 50, 100, 200], help="Concurrent call counts")
+    parser.add_argument('--pools', type=lambda s: s.split(','), default=['inline', 'thread', 'process'])
+    parser.add_argument('--stage', choices=('dsp', 'python'), default='dsp')
+    parser.add_argument('--workers', type=int, default=2, help="Threads or processes per pool")
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each load level")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    print(f"stage={args.stage}, {args.workers} workers per pool, {args.seconds:.0f}s per level")
+    print(f"{'pool':<8} {'calls':>6} {'lag p50':>9} {'lag p99':>9} {'lag max':>9} {'job p50':>9} {'job p99':>9} "
+          f"{'frames':>8} {'late':>6}")
+    asyncio.run(bench(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
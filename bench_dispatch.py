@@ -0,0 +1,130 @@
+"""Micro-benchmark: per-event cost of upstream event dispatch.
+
+Compares the former ``send_to_twilio`` if-chain (list scans and a linear
+``LOG_EVENT_TYPES`` lookup on every message) with the ``EventDispatch`` table
+the bridge now builds, both with no-op handlers so only dispatch is measured.
+Event mixes:
+
+* ``call``         - a typical response: mostly audio and transcript deltas;
+* ``unsubscribed`` - event types nobody handles (item/part lifecycle events);
+* ``plugins``      - the call mix with ``--plugins`` extra metrics hooks.
+
+    python bench_dispatch.py --events 200000
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from event_dispatch import ANY, EventDispatch, HookRegistry
+from transcripts import TRANSCRIPT_EVENT_TYPES
+
+LEGACY_LOG_EVENT_TYPES = [
+    'error', 'response.content.done', 'rate_limits.updated', 'response.done',
+    'input_audio_buffer.committed', 'input_audio_buffer.speech_stopped',
+    'input_audio_buffer.speech_started', 'session.created'
+]
+LOG_EVENT_TYPES = frozenset(LEGACY_LOG_EVENT_TYPES)
+
+CALL_MIX = (
+    ['response.audio.delta'] * 60 + ['response.audio_transcript.delta'] * 25
+    + ['response.created', 'response.output_item.added', 'conversation.item.created',
+       'response.content_part.added', 'response.audio.done', 'response.audio_transcript.done',
+       'response.content_part.done', 'response.output_item.done', 'response.done', 'rate_limits.updated',
+       'input_audio_buffer.speech_started', 'input_audio_buffer.speech_stopped',
+       'input_audio_buffer.committed', 'conversation.item.created', 'response.created']
+)
+UNSUBSCRIBED_MIX = ['response.output_item.added', 'conversation.item.created', 'response.content_part.added',
+                    'response.content_part.done', 'response.output_item.done']
+
+
+def noop(event):
+    return None
+
+
+async def legacy(events):
+    """The pre-dispatch-table chain, with the same tests in the same order."""
+    transcript, endpointer, output_dsp = True, False, True
+    for response in events:
+        if transcript and response['type'] in TRANSCRIPT_EVENT_TYPES:
+            noop(response)
+        if response['type'] == 'input_audio_buffer.speech_stopped' and not endpointer:
+            noop(response)
+        elif response['type'] == 'response.created':
+            noop(response)
+        elif response['type'] == 'rate_limits.updated':
+            noop(response)
+        elif response['type'] == 'response.done':
+            noop(response)
+        if response['type'] in ['response.audio.delta', 'response.content']:
+            if response.get('delta'):
+                noop(response)
+        elif response['type'] == 'response.audio.done' and output_dsp:
+            noop(response)
+        elif response['type'] == 'input_audio_buffer.speech_started' and output_dsp:
+            noop(response)
+        elif response['type'] in LEGACY_LOG_EVENT_TYPES:
+            noop(response)
+
+
+def bridge_dispatch(plugins=0):
+    """The bridge's hook set (with transcripts and output DSP on), plus ``plugins`` metrics hooks."""
+    registry = HookRegistry()
+    for _ in range(plugins):
+        registry.register(lambda session: [('upstream', ANY, noop)])
+    dispatch = EventDispatch()
+    dispatch.on('upstream', TRANSCRIPT_EVENT_TYPES, noop)
+    dispatch.on('upstream', 'input_audio_buffer.speech_stopped', noop)
+    dispatch.on('upstream', 'response.created', noop)
+    dispatch.on('upstream', 'rate_limits.updated', noop)
+    dispatch.on('upstream', 'response.done', noop)
+    dispatch.on('upstream', ('response.audio.delta', 'response.content'), noop)
+    dispatch.on('upstream', 'response.audio.done', noop)
+    dispatch.on('upstream', 'input_audio_buffer.speech_started', noop)
+    dispatch.on('upstream', LOG_EVENT_TYPES, noop)
+    return dispatch.build(None, registry)
+
+
+async def table(events, dispatch):
+    """The bridge's ``send_to_twilio`` loop body."""
+    handlers_by_type, default = dispatch.tables['upstream'], dispatch.any['upstream']
+    for response in events:
+        for handler in handlers_by_type.get(response.get('type'), default):
+            pending = handler(response)
+            if pending is not None:
+                await pending
+
+
+def measure(coro_factory, events, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        asyncio.run(coro_factory(events))
+        best = min(best, time.perf_counter_ns() - started)
+    return best / len(events)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Per-event cost of upstream event dispatch")
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5, help="Best of this many runs")
+    parser.add_argument('--plugins', type=int, default=3, help="Catch-all hooks in the plugins mix")
+    args = parser.parse_args(argv)
+
+    mixes = {'call': CALL_MIX, 'unsubscribed': UNSUBSCRIBED_MIX}
+    print(f"{'mix':<14} {'if-chain ns/event':>18} {'table ns/event':>15}")
+    for name, mix in mixes.items():
+        events = [{'type': mix[i % len(mix)], 'delta': 'AAAA'} for i in range(args.events)]
+        before = measure(legacy, events, args.repeat)
+        dispatch = bridge_dispatch()
+        after = measure(lambda e: table(e, dispatch), events, args.repeat)
+        print(f"{name:<14} {before:>18.0f} {after:>15.0f}")
+    events = [{'type': CALL_MIX[i % len(CALL_MIX)], 'delta': 'AAAA'} for i in range(args.events)]
+    dispatch = bridge_dispatch(args.plugins)
+    with_plugins = measure(lambda e: table(e, dispatch), events, args.repeat)
+    print(f"{'plugins':<14} {'-':>18} {with_plugins:>15.0f}  ({args.plugins} catch-all hooks)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
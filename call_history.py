@@ -0,0 +1,266 @@
+"""Indexed call history fed by Twilio status callbacks and bridge summaries.
+
+Two tables share the call database with the transcripts:
+
+* ``call_events`` is an append-only log of every ``/call-status`` callback;
+* ``calls`` holds one row per CallSid, upserted with the latest status
+  (ordered by Twilio's ``SequenceNumber`` so late callbacks cannot roll the
+  status back) and with the bridge's per-call summary when the media stream
+  ends.
+
+Writes go through the shared ``BatchedSQLiteWriter``.  Listing uses keyset
+pagination on ``(created_at, id)`` so a page costs the same at any depth, and
+``prune`` deletes expired rows, transcript turns included, in small
+transactions so retention never holds the write lock for long.
+"""
+import json
+import logging
+import sqlite3
+import time
+
+from metrics import metrics
+from storage import connect
+
+logger = logging.getLogger(__name__)
+
+CALL_HISTORY_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS calls (
+        id INTEGER PRIMARY KEY,
+        call_sid TEXT NOT NULL UNIQUE,
+        status TEXT,
+        status_seq INTEGER NOT NULL DEFAULT -1,
+        direction TEXT,
+        from_number TEXT,
+        to_number TEXT,
+        call_duration_s INTEGER,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        stream_sid TEXT,
+        profile TEXT,
+        bridge_duration_ms INTEGER,
+        frames_in INTEGER,
+        frames_out INTEGER,
+        latency_p50_ms REAL,
+        latency_p95_ms REAL,
+        latency_max_ms REAL,
+        responses INTEGER,
+        input_tokens INTEGER,
+        output_tokens INTEGER,
+        total_tokens INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_calls_created ON calls (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_calls_status_created ON calls (status, created_at, id)",
+    """CREATE TABLE IF NOT EXISTS call_events (
+        id INTEGER PRIMARY KEY,
+        call_sid TEXT NOT NULL,
+        status TEXT,
+        received_at REAL NOT NULL,
+        payload TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_call_events_call ON call_events (call_sid, received_at)",
+    "CREATE INDEX IF NOT EXISTS idx_call_events_status ON call_events (status, received_at)",
+    "CREATE INDEX IF NOT EXISTS idx_call_events_received ON call_events (received_at)",
+)
+
+_INSERT_EVENT = "INSERT INTO call_events (call_sid, status, received_at, payload) VALUES (?, ?, ?, ?)"
+
+_UPSERT_STATUS = """
+INSERT INTO calls (call_sid, status, status_seq, direction, from_number, to_number,
+                   call_duration_s, created_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(call_sid) DO UPDATE SET
+    status = CASE WHEN excluded.status_seq >= calls.status_seq THEN excluded.status ELSE calls.status END,
+    status_seq = MAX(calls.status_seq, excluded.status_seq),
+    direction = COALESCE(excluded.direction, calls.direction),
+    from_number = COALESCE(excluded.from_number, calls.from_number),
+    to_number = COALESCE(excluded.to_number, calls.to_number),
+    call_duration_s = COALESCE(excluded.call_duration_s, calls.call_duration_s),
+    updated_at = excluded.updated_at
+"""
+
+_SUMMARY_COLUMNS = (
+    'stream_sid', 'profile', 'bridge_duration_ms', 'frames_in', 'frames_out',
+    'latency_p50_ms', 'latency_p95_ms', 'latency_max_ms',
+    'responses', 'input_tokens', 'output_tokens', 'total_tokens',
+)
+
+_UPSERT_SUMMARY = (
+    f"INSERT INTO calls (call_sid, created_at, updated_at, {', '.join(_SUMMARY_COLUMNS)}) "
+    f"VALUES (?, ?, ?, {', '.join('?' for _ in _SUMMARY_COLUMNS)}) "
+    "ON CONFLICT(call_sid) DO UPDATE SET updated_at = excluded.updated_at, "
+    + ', '.join(f"{c} = excluded.{c}" for c in _SUMMARY_COLUMNS)
+)
+
+_LIST_COLUMNS = (
+    "id, call_sid, status, direction, from_number, to_number, call_duration_s, created_at, updated_at, "
+    + ', '.join(_SUMMARY_COLUMNS)
+)
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 1)
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CallStats:
+    """Per-call counters the bridge updates on the hot path and summarizes at the end."""
+
+    MAX_LATENCY_SAMPLES = 2000
+
+    def __init__(self, turn_mode='server_vad'):
+        self.turn_mode = turn_mode
+        self.started_at = time.time()
+        self._t0 = time.monotonic()
+        self.frames_in = 0
+        self.frames_out = 0
+        self.responses = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.total_tokens = 0
+        self.latencies_ms = []
+        self._speech_stopped_at = None
+        self._answered_at = None
+        self._answer_metric = None
+
+    def mark_answered(self, at, warm):
+        """Measure answer-to-first-audio for an inbound call answered at ``at`` (monotonic)."""
+        self._answered_at = at
+        self._answer_metric = f"inbound.answer_to_first_audio_ms.{'warm' if warm else 'cold'}"
+
+    def on_speech_stopped(self, at=None):
+        """Mark the end of caller speech (``at`` is a monotonic time; default now)."""
+        self._speech_stopped_at = at if at is not None else time.monotonic()
+
+    def on_audio_out(self):
+        self.frames_out += 1
+        if self.frames_out == 1 and self._answered_at is not None:
+            metrics.observe(self._answer_metric, (time.monotonic() - self._answered_at) * 1000)
+        if self._speech_stopped_at is not None:
+            # Speech end to first audio of the reply
+            latency_ms = (time.monotonic() - self._speech_stopped_at) * 1000
+            metrics.observe(f'turn.response_latency_ms.{self.turn_mode}', latency_ms)
+            if len(self.latencies_ms) < self.MAX_LATENCY_SAMPLES:
+                self.latencies_ms.append(latency_ms)
+            self._speech_stopped_at = None
+
+    def on_response_done(self, event):
+        self.responses += 1
+        usage = (event.get('response') or {}).get('usage') or {}
+        self.input_tokens += usage.get('input_tokens') or 0
+        self.output_tokens += usage.get('output_tokens') or 0
+        self.total_tokens += usage.get('total_tokens') or 0
+
+    def summary(self):
+        ordered = sorted(self.latencies_ms)
+        return {
+            'bridge_duration_ms': int((time.monotonic() - self._t0) * 1000),
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+            'latency_p50_ms': _percentile(ordered, 50),
+            'latency_p95_ms': _percentile(ordered, 95),
+            'latency_max_ms': round(ordered[-1], 1) if ordered else None,
+            'responses': self.responses,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'total_tokens': self.total_tokens,
+        }
+
+
+class CallHistoryStore:
+    def __init__(self, writer):
+        self.writer = writer
+        writer.add_schema(CALL_HISTORY_SCHEMA)
+
+    def add_status(self, form):
+        """Queue one Twilio status callback (the parsed form as a dict)."""
+        call_sid = form.get('CallSid')
+        if not call_sid:
+            logger.warning(f"Status callback without CallSid: {form}")
+            return
+        now = time.time()
+        status = form.get('CallStatus')
+        self.writer.submit(_INSERT_EVENT, (call_sid, status, now, json.dumps(form)))
+        self.writer.submit(_UPSERT_STATUS, (
+            call_sid, status, _int_or_none(form.get('SequenceNumber')) or 0,
+            form.get('Direction'), form.get('From'), form.get('To'),
+            _int_or_none(form.get('CallDuration')), now, now
+        ))
+
+    def add_summary(self, call_sid, stream_sid, profile, stats):
+        """Queue the bridge summary for one media stream."""
+        now = time.time()
+        summary = dict(stats.summary(), stream_sid=stream_sid, profile=profile)
+        self.writer.submit(_UPSERT_SUMMARY, (call_sid, stats.started_at, now) + tuple(summary[c] for c in _SUMMARY_COLUMNS))
+
+    def list_calls(self, status=None, since=None, until=None, cursor=None, limit=50):
+        """Return ``(rows, next_cursor)``, newest first (blocking)."""
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor:
+            created_at, row_id = cursor.split(':', 1)
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend([float(created_at), int(row_id)])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self.writer.query(
+            f"SELECT {_LIST_COLUMNS} FROM calls {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+            params + [limit]
+        )
+        calls = [dict(row) for row in rows]
+        next_cursor = f"{calls[-1]['created_at']!r}:{calls[-1]['id']}" if len(calls) == limit else None
+        return calls, next_cursor
+
+    def get_call(self, call_sid):
+        """Return the call row and its status events, or None (blocking)."""
+        rows = self.writer.query(f"SELECT {_LIST_COLUMNS} FROM calls WHERE call_sid = ?", (call_sid,))
+        if not rows:
+            return None
+        events = self.writer.query(
+            "SELECT status, received_at, payload FROM call_events WHERE call_sid = ? ORDER BY received_at, id",
+            (call_sid,)
+        )
+        return {
+            'call': dict(rows[0]),
+            'events': [dict(e, payload=json.loads(e['payload'])) for e in events],
+        }
+
+    def prune(self, cutoff, chunk=5000, pause=0.01):
+        """Delete history older than ``cutoff`` (epoch seconds) in short transactions (blocking)."""
+        deleted = 0
+        conn = connect(self.writer.path)
+        try:
+            tables = (('transcript_turns', 'created_at'), ('call_events', 'received_at'), ('calls', 'created_at'))
+            for table, column in tables:
+                while True:
+                    try:
+                        with conn:
+                            cur = conn.execute(
+                                f"DELETE FROM {table} WHERE id IN "
+                                f"(SELECT id FROM {table} WHERE {column} < ? LIMIT ?)",
+                                (cutoff, chunk)
+                            )
+                    except sqlite3.OperationalError as e:
+                        logger.warning(f"Pruning {table} deferred: {e}")
+                        break
+                    deleted += cur.rowcount
+                    if cur.rowcount < chunk:
+                        break
+                    time.sleep(pause)  # let the batch writer in between chunks
+        finally:
+            conn.close()
+        return deleted
@@ -0,0 +1,141 @@
+"""Compact record/replay traces for the /media-stream bridge.
+
+A trace is an append-only binary log of every frame that crosses the bridge,
+on both the Twilio leg and the upstream realtime leg:
+
+    header:  b'AVTRACE1' | u32 metadata length | metadata (UTF-8 JSON)
+    record:  u64 t_ns | u8 leg | u8 direction | u32 length | payload
+
+``t_ns`` is nanoseconds since the trace was opened, taken from the monotonic
+clock.  Payloads are the exact text frames as sent or received, so a trace can
+be fed back through ``handle_media_stream`` by ``replay_trace.py``.  Readers
+stop quietly at a truncated final record, so a trace from a crashed worker is
+still usable.  The Twilio leg is recorded by ``TracedTwilioSocket``; the
+upstream leg by the realtime connection itself (``attach_recorder``).
+"""
+import json
+import logging
+import os
+import struct
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'AVTRACE1'
+TRACE_VERSION = 1
+TRACE_SUFFIX = '.avtrace'
+
+# Legs
+LEG_TWILIO = 0
+LEG_UPSTREAM = 1
+
+# Directions, seen from the bridge
+DIR_IN = 0   # received by the bridge
+DIR_OUT = 1  # sent by the bridge
+
+LEG_NAMES = {LEG_TWILIO: 'twilio', LEG_UPSTREAM: 'upstream'}
+DIR_NAMES = {DIR_IN: 'in', DIR_OUT: 'out'}
+
+_LENGTH = struct.Struct('<I')
+_RECORD = struct.Struct('<QBBI')
+
+TraceRecord = namedtuple('TraceRecord', 't_ns leg direction payload')
+
+
+class TraceRecorder:
+    """Append frames for one bridged call to a trace file."""
+
+    def __init__(self, path, metadata=None, buffer_size=64 * 1024):
+        self.path = path
+        self._file = open(path, 'ab', buffering=buffer_size)
+        self._t0 = time.monotonic_ns()
+        self.records = 0
+        header = {
+            'version': TRACE_VERSION,
+            'created': datetime.now(timezone.utc).isoformat(),
+            'clock': 'monotonic_ns',
+        }
+        header.update(metadata or {})
+        encoded = json.dumps(header).encode('utf-8')
+        self._file.write(MAGIC + _LENGTH.pack(len(encoded)) + encoded)
+
+    def record(self, leg, direction, payload):
+        """Append one frame; ``payload`` is the raw text or bytes frame."""
+        if self._file is None:
+            return
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        t_ns = time.monotonic_ns() - self._t0
+        self._file.write(_RECORD.pack(t_ns, leg, direction, len(payload)))
+        self._file.write(payload)
+        self.records += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Trace closed: {self.path} ({self.records} records)")
+
+
+def open_trace_recorder(trace_dir, **metadata):
+    """Return a recorder writing into ``trace_dir``, or None when tracing is off."""
+    if not trace_dir:
+        return None
+    try:
+        os.makedirs(trace_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        name = f"trace-{stamp}-{uuid.uuid4().hex[:8]}{TRACE_SUFFIX}"
+        return TraceRecorder(os.path.join(trace_dir, name), metadata)
+    except OSError as e:
+        logger.error(f"Could not open trace in {trace_dir}: {e}")
+        return None
+
+
+def read_trace(path):
+    """Return ``(metadata, records)`` for the trace at ``path``."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a bridge trace")
+    offset = len(MAGIC)
+    (meta_len,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    metadata = json.loads(data[offset:offset + meta_len].decode('utf-8'))
+    offset += meta_len
+
+    records = []
+    while offset + _RECORD.size <= len(data):
+        t_ns, leg, direction, length = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        if start + length > len(data):
+            logger.warning(f"Trace {path} ends with a truncated record")
+            break
+        records.append(TraceRecord(t_ns, leg, direction, data[start:start + length].decode('utf-8')))
+        offset = start + length
+    return metadata, records
+
+
+class TracedTwilioSocket:
+    """Wrap the Twilio-facing WebSocket and record every text frame."""
+
+    def __init__(self, websocket, recorder):
+        self._websocket = websocket
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._websocket, name)
+
+    async def iter_text(self):
+        async for message in self._websocket.iter_text():
+            self._recorder.record(LEG_TWILIO, DIR_IN, message)
+            yield message
+
+    async def send_text(self, data):
+        self._recorder.record(LEG_TWILIO, DIR_OUT, data)
+        await self._websocket.send_text(data)
+
+    async def send_json(self, data, mode='text'):
+        await self.send_text(json.dumps(data, separators=(',', ':'), ensure_ascii=False))
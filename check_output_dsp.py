@@ -0,0 +1,76 @@
+"""Self-check: stream audio through ``OutputDSP`` at every speech rate.
+
+Noise and a tone are fed through the outbound stage in 100 ms deltas, as the
+realtime API sends them, then flushed like ``response.audio.done`` does.  A
+rate fails if the stage raises or if the output length strays from
+input / rate by more than the tolerance.
+
+    python check_output_dsp.py
+    python check_output_dsp.py --rates 0.5,0.8,1.5 --trials 20
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from audio_dsp import SAMPLE_RATE, OutputDSP, encode_ulaw
+
+DELTA_BYTES = SAMPLE_RATE // 10  # 100 ms of mu-law
+
+
+def test_signals(seconds, seed):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return {
+        'noise': encode_ulaw(0.3 * rng.standard_normal(len(t))),
+        'tone': encode_ulaw(0.3 * np.sin(2 * np.pi * rng.uniform(100, 1000) * t)),
+    }
+
+
+def stretch(audio, rate, volume=1.0):
+    """Return the number of bytes ``OutputDSP`` produces for ``audio``."""
+    stage = OutputDSP(volume=volume, speech_rate=rate)
+    produced = 0
+    for i in range(0, len(audio), DELTA_BYTES):
+        produced += len(stage.process(audio[i:i + DELTA_BYTES]))
+    return produced + len(stage.flush())
+
+
+def check(rates, seconds, trials, tolerance):
+    """Return ``(rate, signal, trial, problem)`` for every failure."""
+    failures = []
+    for rate in rates:
+        for trial in range(trials):
+            for name, audio in test_signals(seconds, trial).items():
+                try:
+                    produced = stretch(audio, rate)
+                except Exception as e:
+                    failures.append((rate, name, trial, repr(e)))
+                    continue
+                expected = len(audio) / rate
+                if abs(produced - expected) > tolerance * expected:
+                    failures.append((rate, name, trial, f"{produced} bytes out, expected about {expected:.0f}"))
+    return failures
+
+
+def _floats(text):
+    return [float(v) for v in text.split(',') if v]
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Check OutputDSP across speech rates")
+    parser.add_argument('--rates', type=_floats, default=[0.5, 0.6, 0.75, 0.8, 0.9, 0.95, 1.1, 1.25, 1.5, 2.0])
+    parser.add_argument('--seconds', type=float, default=3.0, help="Length of each test signal")
+    parser.add_argument('--trials', type=int, default=5, help="Random seeds per rate")
+    parser.add_argument('--tolerance', type=float, default=0.05, help="Allowed relative length error")
+    args = parser.parse_args(argv)
+
+    failures = check(args.rates, args.seconds, args.trials, args.tolerance)
+    for rate, name, trial, problem in failures:
+        print(f"FAIL rate={rate} signal={name} trial={trial}: {problem}")
+    print(f"{len(args.rates)} rates x {args.trials} trials: {'ok' if not failures else f'{len(failures)} failures'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,155 @@
+"""Client-side end-of-utterance detection for manual turn-detection mode.
+
+With ``turn_detection.mode = "manual"`` in a profile the bridge turns server
+VAD off and decides turn ends itself: every inbound μ-law frame goes through an
+``Endpointer``, and when it reports ``speech_stopped`` the bridge sends exactly
+one ``input_audio_buffer.commit`` plus ``response.create``.
+
+A frame is voiced when its energy clears the tracked noise floor by
+``margin_db`` (and an absolute minimum, so digital silence never counts).  The
+floor follows quieter frames quickly and creeps up slowly otherwise, so a
+steady background hum is absorbed within a few seconds without speech pulling
+the floor up.  A turn starts after ``min_speech_ms`` of voiced audio and ends
+after ``hangover_ms`` of trailing silence, or after ``max_turn_ms`` in any case.
+
+``ServerVadSimulator`` approximates the realtime API's ``server_vad`` for
+offline runs (the loopback backend and ``vad_sweep.py``): it maps the same
+SNR to a speech probability, compares it with ``threshold`` and segments with
+``prefix_padding_ms`` and ``silence_duration_ms`` like the server does.
+"""
+import math
+
+import numpy as np
+
+from audio_dsp import ULAW_TO_FLOAT, SAMPLE_RATE
+
+SPEECH_STARTED = 'speech_started'
+SPEECH_STOPPED = 'speech_stopped'
+
+
+def frame_energy_db(ulaw):
+    """Mean power of a μ-law frame in dBFS."""
+    samples = ULAW_TO_FLOAT[np.frombuffer(ulaw, dtype=np.uint8)]
+    return 10 * np.log10(float(np.mean(samples * samples)) + 1e-10)
+
+
+class NoiseFloor:
+    """Noise floor that follows quieter frames quickly and louder ones slowly."""
+
+    def __init__(self, rise_db_per_s=2.0, fall=0.3):
+        self.rise_db_per_s = rise_db_per_s
+        self.fall = fall
+        self.db = None
+
+    def update(self, energy_db, frame_ms):
+        if self.db is None:
+            self.db = energy_db
+        elif energy_db < self.db:
+            self.db += (energy_db - self.db) * self.fall
+        else:
+            self.db += min(energy_db - self.db, self.rise_db_per_s * frame_ms / 1000)
+
+
+class Endpointer:
+    """Streaming energy endpointer with an adaptive noise floor."""
+
+    def __init__(self, hangover_ms=500, min_speech_ms=100, margin_db=9.0, min_energy_db=-50.0,
+                 max_turn_ms=15000, floor_rise_db_per_s=2.0, floor_fall=0.3):
+        self.hangover_ms = hangover_ms
+        self.min_speech_ms = min_speech_ms
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.max_turn_ms = max_turn_ms
+        self.floor = NoiseFloor(floor_rise_db_per_s, floor_fall)
+        self.in_speech = False
+        self.onset_ms = 0
+        self.turn_ms = 0
+        self.trailing_silence_ms = 0
+        self.turns = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from a profile's ``turn_detection`` block."""
+        keys = ('hangover_ms', 'min_speech_ms', 'margin_db', 'min_energy_db', 'max_turn_ms')
+        return cls(**{k: float(config[k]) for k in keys if config.get(k) is not None})
+
+    @property
+    def noise_floor_db(self):
+        return self.floor.db
+
+    def process(self, ulaw):
+        """Feed one frame; return ``SPEECH_STARTED``, ``SPEECH_STOPPED`` or None."""
+        if not ulaw:
+            return None
+        frame_ms = len(ulaw) * 1000 / SAMPLE_RATE
+        energy_db = frame_energy_db(ulaw)
+        threshold = self.min_energy_db if self.noise_floor_db is None else max(
+            self.noise_floor_db + self.margin_db, self.min_energy_db)
+        voiced = energy_db > threshold
+        self.floor.update(energy_db, frame_ms)
+
+        if not self.in_speech:
+            self.onset_ms = self.onset_ms + frame_ms if voiced else 0
+            if self.onset_ms >= self.min_speech_ms:
+                self.in_speech = True
+                self.turn_ms = self.onset_ms
+                self.trailing_silence_ms = 0
+                return SPEECH_STARTED
+            return None
+
+        self.turn_ms += frame_ms
+        self.trailing_silence_ms = 0 if voiced else self.trailing_silence_ms + frame_ms
+        if self.trailing_silence_ms >= self.hangover_ms or self.turn_ms >= self.max_turn_ms:
+            self.in_speech = False
+            self.onset_ms = 0
+            self.turns += 1
+            return SPEECH_STOPPED
+        return None
+
+
+def speech_probability(energy_db, floor_db, min_energy_db=-50.0):
+    """Map a frame's SNR to a 0..1 speech likelihood (0.5 at 9 dB above the floor)."""
+    if energy_db <= min_energy_db or floor_db is None:
+        return 0.0
+    return 1 / (1 + math.exp(-(energy_db - floor_db - 9.0) / 3.0))
+
+
+class ServerVadSimulator:
+    """Offline approximation of ``server_vad`` segmentation.
+
+    ``process`` returns ``(event_type, fields)`` tuples for the frame, with
+    ``audio_start_ms`` / ``audio_end_ms`` on the input buffer's clock.
+    """
+
+    def __init__(self, threshold=0.5, prefix_padding_ms=300, silence_duration_ms=500):
+        self.threshold = threshold
+        self.prefix_padding_ms = prefix_padding_ms
+        self.silence_duration_ms = silence_duration_ms
+        self.floor = NoiseFloor()
+        self.position_ms = 0.0
+        self.in_speech = False
+        self.last_speech_end_ms = 0.0
+
+    @classmethod
+    def from_turn_detection(cls, config):
+        keys = ('threshold', 'prefix_padding_ms', 'silence_duration_ms')
+        return cls(**{k: config[k] for k in keys if config.get(k) is not None})
+
+    def process(self, ulaw):
+        frame_ms = len(ulaw) * 1000 / SAMPLE_RATE
+        energy_db = frame_energy_db(ulaw)
+        speech = speech_probability(energy_db, self.floor.db) > self.threshold
+        self.floor.update(energy_db, frame_ms)
+        start_ms, self.position_ms = self.position_ms, self.position_ms + frame_ms
+
+        events = []
+        if speech:
+            if not self.in_speech:
+                self.in_speech = True
+                events.append(('input_audio_buffer.speech_started',
+                               {'audio_start_ms': int(max(0.0, start_ms - self.prefix_padding_ms))}))
+            self.last_speech_end_ms = self.position_ms
+        elif self.in_speech and self.position_ms - self.last_speech_end_ms >= self.silence_duration_ms:
+            self.in_speech = False
+            events.append(('input_audio_buffer.speech_stopped', {'audio_end_ms': int(self.last_speech_end_ms)}))
+        return events
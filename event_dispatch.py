@@ -0,0 +1,122 @@
+"""Table-driven dispatch of upstream and Twilio events to hooks.
+
+Each bridge builds one ``EventDispatch`` when its stream starts: the bridge's
+own handlers first, then whatever the registered plugins return for that
+session.  ``build`` folds them into one dict per source mapping an event type
+to a tuple of handlers, so dispatching is a dict lookup and a loop over a
+tuple, and an event nobody subscribed to costs a dict miss.
+
+Handlers take the event dict and return None or an awaitable, so plain
+functions (metrics, logging) never pay for a coroutine.  ``ANY`` subscribes to
+every event of a source.
+
+A plugin is a callable taking the bridge's ``Session`` and returning
+``(source, event_types, handler)`` tuples for that call::
+
+    from event_dispatch import hooks
+
+    @hooks.register
+    def count_dtmf(session):
+        return [('twilio', 'dtmf', lambda event: metrics.inc('twilio.dtmf'))]
+
+Twilio hooks see every event of the stream: ``connected`` and ``start`` are
+read before the tables can be built (``start`` picks the profile) and are
+dispatched right after ``build``, before the first media frame.
+
+Plugin handlers are guarded: an exception is logged and counted under
+``hooks.errors`` and does not end the call.
+"""
+import inspect
+import logging
+import traceback
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ('upstream', 'twilio')
+ANY = '*'
+
+
+class HookRegistry:
+    """Process-wide plugins, applied to every bridge as it starts."""
+
+    def __init__(self):
+        self.plugins = []
+
+    def register(self, plugin):
+        """Add a plugin; usable as a decorator."""
+        self.plugins.append(plugin)
+        return plugin
+
+    def unregister(self, plugin):
+        if plugin in self.plugins:
+            self.plugins.remove(plugin)
+
+
+def _guard(handler, name):
+    """Wrap a plugin handler so its failures are logged instead of ending the call."""
+    async def finish(pending):
+        try:
+            await pending
+        except Exception as e:
+            _failed(name, e)
+
+    def guarded(event):
+        try:
+            result = handler(event)
+        except Exception as e:
+            _failed(name, e)
+            return None
+        return finish(result) if result is not None and inspect.isawaitable(result) else None
+
+    return guarded
+
+
+def _failed(name, error):
+    metrics.inc('hooks.errors')
+    logger.error(f"Event hook {name} failed: {error}")
+    logger.error(traceback.format_exc())
+
+
+class EventDispatch:
+    """Per-session dispatch tables; call ``on`` for each hook, then ``build``."""
+
+    def __init__(self):
+        self._hooks = {source: [] for source in SOURCES}
+        self.tables = {source: {} for source in SOURCES}
+        self.any = {source: () for source in SOURCES}
+
+    def on(self, source, event_types, handler):
+        """Subscribe ``handler`` to one event type, an iterable of them, or ``ANY``."""
+        if source not in self._hooks:
+            raise ValueError(f"Unknown event source '{source}'")
+        if isinstance(event_types, str):
+            event_types = (event_types,)
+        for event_type in event_types:
+            self._hooks[source].append((event_type, handler))
+
+    def build(self, session=None, registry=None):
+        """Add the plugins' hooks for ``session`` and build the dispatch tables."""
+        for plugin in (registry.plugins if registry else ()):
+            name = getattr(plugin, '__name__', repr(plugin))
+            try:
+                for source, event_types, handler in plugin(session) or ():
+                    self.on(source, event_types, _guard(handler, name))
+            except Exception as e:
+                _failed(name, e)
+        for source, hooks in self._hooks.items():
+            wildcard = tuple(handler for event_type, handler in hooks if event_type == ANY)
+            table = {}
+            for event_type in dict.fromkeys(event_type for event_type, _ in hooks if event_type != ANY):
+                # Registration order, with catch-all handlers where they were added
+                table[event_type] = tuple(h for t, h in hooks if t == event_type or t == ANY)
+            self.tables[source] = table
+            self.any[source] = wildcard
+        return self
+
+    def handlers(self, source, event_type):
+        return self.tables[source].get(event_type, self.any[source])
+
+
+hooks = HookRegistry()
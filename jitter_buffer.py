@@ -0,0 +1,166 @@
+"""Adaptive inbound jitter buffer for Twilio media frames.
+
+Twilio sends a 20 ms frame every 20 ms, but the network delivers them in
+bursts, occasionally out of order and sometimes not at all.  Forwarding frames
+in arrival order compresses time upstream and confuses server VAD.  The bridge
+pushes every ``media`` event into a ``JitterBuffer`` and a playout task
+releases frames on a steady 20 ms cadence instead:
+
+* frames are ordered by ``media.chunk`` (Twilio's per-track counter); late
+  frames whose slot has already played and duplicates are dropped;
+* gaps are found from ``media.timestamp``: a missing slot up to
+  ``max_fill_ms`` long is filled with comfort noise at the caller's noise
+  floor, so the upstream audio clock keeps matching Twilio's; longer gaps are
+  skipped;
+* playout starts once ``depth`` frames are buffered.  An underrun raises the
+  depth by one frame (up to ``max_depth_ms``) and re-primes; after
+  ``relax_after_ms`` without one the depth drops back by a frame.  A buffer
+  deeper than the target drains one extra frame per tick, and one beyond
+  ``max_depth_ms`` releases the excess at once, so latency stays small.
+
+``stats`` returns the per-call counters.
+"""
+import asyncio
+import heapq
+
+import numpy as np
+
+from audio_dsp import SAMPLE_RATE, encode_ulaw
+from endpointing import NoiseFloor, frame_energy_db
+
+FRAME_MS = 20
+COUNTERS = ('received', 'released', 'reordered', 'duplicates', 'late', 'gaps', 'concealed', 'skipped',
+            'underruns', 'overflows')
+
+
+class JitterBuffer:
+    def __init__(self, min_depth_ms=20, max_depth_ms=120, max_fill_ms=200, relax_after_ms=5000):
+        self.min_depth = max(1, round(min_depth_ms / FRAME_MS))
+        self.max_depth = max(self.min_depth, round(max_depth_ms / FRAME_MS))
+        self.max_fill_ms = max_fill_ms
+        self.relax_after = max(1, round(relax_after_ms / FRAME_MS))
+        self.depth = self.min_depth  # target depth in frames
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.closed = False
+        self.next_release_at = None  # None until primed
+        self._heap = []  # (chunk, timestamp_ms, payload)
+        self._buffered = set()
+        self._highest = None
+        self._next_ts = None  # timestamp of the next slot to play
+        self._gap_started = None  # slot where the current gap was detected
+        self._gap_fill = False
+        self._steady = 0
+        self._floor = NoiseFloor()
+        self._rng = np.random.default_rng()
+        self._wake = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from a profile's ``jitter_buffer`` block."""
+        keys = ('min_depth_ms', 'max_depth_ms', 'max_fill_ms', 'relax_after_ms')
+        return cls(**{k: float(config[k]) for k in keys if config.get(k) is not None})
+
+    @property
+    def buffered(self):
+        return len(self._heap)
+
+    def push(self, chunk, timestamp, payload):
+        """Buffer one frame as received."""
+        self.counts['received'] += 1
+        if self._next_ts is not None and timestamp < self._next_ts:
+            self.counts['late'] += 1
+            return
+        if chunk in self._buffered:
+            self.counts['duplicates'] += 1
+            return
+        if self._highest is not None and chunk < self._highest:
+            self.counts['reordered'] += 1
+        else:
+            self._highest = chunk
+        self._floor.update(frame_energy_db(payload), len(payload) * 1000 / SAMPLE_RATE)
+        heapq.heappush(self._heap, (chunk, timestamp, payload))
+        self._buffered.add(chunk)
+        if len(self._heap) > self.max_depth or (self.next_release_at is None and len(self._heap) >= self.depth):
+            self._notify()
+
+    def close(self):
+        """No more frames will arrive; the rest is released on the next ``release``."""
+        self.closed = True
+        self._notify()
+
+    def release(self, now):
+        """Return the ``(timestamp, payload)`` frames due at ``now`` (loop time), in order."""
+        out = []
+        if self.closed:
+            while self._heap:
+                self._play(out)
+            return out
+        if self.next_release_at is None:
+            if len(self._heap) < self.depth:
+                return out
+            self.next_release_at = now
+        while len(self._heap) > self.max_depth:
+            self.counts['overflows'] += 1
+            self._play(out)
+        while self.next_release_at <= now:
+            if not self._heap:
+                # Underrun: wait for a deeper buffer before playing again
+                self.counts['underruns'] += 1
+                self.depth = min(self.depth + 1, self.max_depth)
+                self.next_release_at = None
+                self._steady = 0
+                break
+            self._play(out)
+            if len(self._heap) > self.depth:
+                self._play(out)
+            self.next_release_at += FRAME_MS / 1000
+            self._steady += 1
+            if self._steady >= self.relax_after and self.depth > self.min_depth:
+                self.depth -= 1
+                self._steady = 0
+        return out
+
+    def _play(self, out):
+        """Play the next slot: the buffered frame, comfort noise for a short gap, or skip a long one."""
+        chunk, timestamp, payload = self._heap[0]
+        if self._next_ts is not None and timestamp - self._next_ts >= FRAME_MS / 2:
+            if self._gap_started != self._next_ts:
+                self.counts['gaps'] += 1
+                self._gap_started = self._next_ts
+                self._gap_fill = timestamp - self._next_ts <= self.max_fill_ms
+            if self._gap_fill:
+                self.counts['concealed'] += 1
+                out.append((self._next_ts, self._comfort_noise()))
+                self._next_ts += FRAME_MS
+                self._gap_started = self._next_ts
+                return
+            self.counts['skipped'] += round((timestamp - self._next_ts) / FRAME_MS)
+        heapq.heappop(self._heap)
+        self._buffered.discard(chunk)
+        self.counts['released'] += 1
+        self._next_ts = timestamp + len(payload) * 1000 // SAMPLE_RATE
+        out.append((timestamp, payload))
+
+    def _comfort_noise(self):
+        level_db = min(max(self._floor.db if self._floor.db is not None else -70.0, -70.0), -45.0)
+        samples = self._rng.standard_normal(SAMPLE_RATE * FRAME_MS // 1000) * 10 ** (level_db / 20)
+        return encode_ulaw(samples)
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def wait(self):
+        """Sleep until the next frame is due, or until a push or ``close`` needs a release."""
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        timer = loop.call_at(self.next_release_at, self._wake.set) if self.next_release_at is not None else None
+        try:
+            await self._wake.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._wake = None
+
+    def stats(self):
+        return dict(self.counts, depth_ms=self.depth * FRAME_MS, buffered=len(self._heap))
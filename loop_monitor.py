@@ -0,0 +1,147 @@
+"""Event-loop lag monitoring and a stdlib-only sampling profiler.
+
+Every bridge, REST endpoint and template render shares one asyncio loop, so a
+single blocking coroutine stutters audio on every call.  ``LoopLagMonitor``
+measures scheduling delay from a ticker task and, from a watchdog thread,
+captures the stack of whatever is running on the loop when a stall crosses the
+threshold.  ``sample_profile`` samples thread stacks for a fixed window and
+returns them in collapsed ("folded") form for flame graph tooling, with the
+running asyncio task name as the root frame of loop-thread samples.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LAG_HISTOGRAM = 'loop.lag_ms'
+LAG_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 5000)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _running_task_name(loop):
+    if loop is None:
+        return None
+    try:
+        task = asyncio.current_task(loop)
+    except RuntimeError:
+        return None
+    return task.get_name() if task is not None else None
+
+
+class LoopLagMonitor:
+    """Record loop scheduling delay and capture stacks of long stalls."""
+
+    def __init__(self, interval=0.05, stall_threshold=0.1, max_stalls=50):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.stalls = deque(maxlen=max_stalls)
+        self.last_lag_ms = 0.0
+        self._histogram = metrics.histogram(LAG_HISTOGRAM, LAG_BUCKETS_MS)
+        self._loop = None
+        self._loop_thread_id = None
+        self._heartbeat = time.monotonic()
+        self._task = None
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def start(self):
+        """Start monitoring the running loop; call from the loop thread."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._tick(), name='loop-lag-monitor')
+        self._watchdog = threading.Thread(target=self._watch, name='loop-lag-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(f"Loop lag monitor started (interval {self.interval * 1000:.0f} ms, "
+                    f"stall threshold {self.stall_threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _tick(self):
+        while True:
+            scheduled = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag_ms = max(0.0, (now - scheduled - self.interval) * 1000)
+            self.last_lag_ms = lag_ms
+            self._histogram.observe(lag_ms)
+            self._heartbeat = now
+
+    def _watch(self):
+        captured_for = None
+        poll = max(self.stall_threshold / 4, 0.005)
+        while not self._stop.wait(poll):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.stall_threshold or captured_for == heartbeat:
+                continue
+            # One capture per stall: the heartbeat only moves once the loop runs again
+            captured_for = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            task = _running_task_name(self._loop)
+            self.stalls.append({
+                'at': time.time(),
+                'stalled_ms': round(stalled * 1000, 1),
+                'task': task,
+                'stack': [line.rstrip() for line in stack],
+            })
+            metrics.inc('loop.stalls')
+            logger.warning(f"Event loop stalled {stalled * 1000:.0f} ms in task {task}")
+
+    def snapshot(self):
+        return {
+            'interval_ms': self.interval * 1000,
+            'stall_threshold_ms': self.stall_threshold * 1000,
+            'last_lag_ms': round(self.last_lag_ms, 3),
+            'lag_ms': self._histogram.snapshot(),
+            'stalls': list(self.stalls),
+        }
+
+
+def sample_profile(duration=5.0, interval=0.005, loop=None, loop_thread_id=None, all_threads=False):
+    """Sample thread stacks for ``duration`` seconds; return collapsed stack lines.
+
+    Blocking: run it in a worker thread.  Only the loop thread is sampled unless
+    ``all_threads`` is set; the sampler's own thread is always skipped.
+    """
+    own_id = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (not all_threads and thread_id != loop_thread_id):
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.reverse()
+            root = [names.get(thread_id, str(thread_id))]
+            if thread_id == loop_thread_id:
+                root.append(f"task:{_running_task_name(loop) or 'idle'}")
+            stacks[';'.join(root + labels)] += 1
+        time.sleep(interval)
+    return [f"{stack} {count}" for stack, count in stacks.most_common()]
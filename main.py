@@ -1,22 +1,45 @@
 import os
 import json
 import asyncio
+import base64
+import hmac
 import re
-import ssl
+import threading
+import time
 from fastapi import FastAPI, WebSocket, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from starlette.websockets import WebSocketState
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from twilio.rest import Client
-import aiohttp
+from twilio.request_validator import RequestValidator
 from dotenv import load_dotenv
 import uvicorn
 import logging
 import traceback
 import httpx
-from fastapi.staticfiles import StaticFiles
+from functools import lru_cache
+from xml.sax.saxutils import quoteattr
+from urllib.parse import parse_qs
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
+from call_trace import open_trace_recorder, TracedTwilioSocket
+from loop_monitor import LoopLagMonitor, sample_profile
+from metrics import metrics
+from audio_dsp import LEVEL_BUCKETS_DBFS, build_input_dsp, build_output_dsp
+from endpointing import Endpointer, SPEECH_STARTED, SPEECH_STOPPED
+from storage import BatchedSQLiteWriter
+from static_assets import StaticAssets, Asset
+from realtime_backends import EndpointSelector, LoopbackBackend, OpenAIRealtimeBackend
+from transcripts import TranscriptAssembler, TranscriptStore, TRANSCRIPT_EVENT_TYPES
+from call_history import CallHistoryStore, CallStats
+from sessions import SessionRegistry
+from monitor import MonitorHub, MODES as MONITOR_MODES
+from warmup import WarmSessions
+from admission import AdmissionController, Rejected
+from audio_workers import AudioWorkers
+from jitter_buffer import COUNTERS as JITTER_COUNTERS, JitterBuffer
+from event_dispatch import EventDispatch, hooks
 
 # Configure logging
 logging.basicConfig(
@@ -41,6 +64,36 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 DOMAIN = re.sub(r'(^\w+:|^)\/\/|\/+$', '', os.getenv('DOMAIN', ''))
 
 PORT = int(os.getenv('PORT', 6060))
+TRACE_DIR = os.getenv('TRACE_DIR', '')  # Record bridge traces here when set
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')  # Required by /admin and /monitor; both are refused while unset
+LOOP_LAG_INTERVAL_MS = float(os.getenv('LOOP_LAG_INTERVAL_MS', 50))
+LOOP_STALL_THRESHOLD_MS = float(os.getenv('LOOP_STALL_THRESHOLD_MS', 100))
+PROFILES_PATH = os.getenv('PROFILES_PATH') or os.path.join(os.path.dirname(__file__), 'profiles.json')
+CALL_DB_PATH = os.getenv('CALL_DB_PATH') or os.path.join(os.path.dirname(__file__), 'call_data.db')
+CALL_HISTORY_RETENTION_DAYS = float(os.getenv('CALL_HISTORY_RETENTION_DAYS', 90))
+CALL_HISTORY_PRUNE_INTERVAL_S = float(os.getenv('CALL_HISTORY_PRUNE_INTERVAL_S', 3600))
+
+# Upstream realtime backend: 'openai', or 'loopback' to run fully offline
+REALTIME_BACKEND = os.getenv('REALTIME_BACKEND') or 'openai'
+REALTIME_ENDPOINTS = [
+    url.strip() for url in (os.getenv('REALTIME_ENDPOINTS') or 'wss://api.openai.com/v1/realtime').split(',')
+    if url.strip()
+]
+REALTIME_MODEL = os.getenv('REALTIME_MODEL') or 'gpt-4o-realtime-preview-2024-10-01'
+REALTIME_PROBE_INTERVAL_S = float(os.getenv('REALTIME_PROBE_INTERVAL_S') or 60)
+LOOPBACK_MODE = os.getenv('LOOPBACK_MODE') or 'tone'  # 'tone' answers each response, 'echo' returns caller audio
+WARM_UPSTREAM = (os.getenv('WARM_UPSTREAM') or 'true').lower() in ('1', 'true', 'yes')  # Inbound calls only
+WARM_SESSION_TTL_S = float(os.getenv('WARM_SESSION_TTL_S') or 30)
+# Admission control for new media streams; profiles may override with an "admission" block
+ADMISSION_MAX_SESSIONS = int(os.getenv('ADMISSION_MAX_SESSIONS') or 0)  # 0 = unlimited
+ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv('ADMISSION_MAX_LOOP_LAG_MS') or 250)
+ADMISSION_MIN_HEADROOM = float(os.getenv('ADMISSION_MIN_HEADROOM') or 0.05)
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv('ADMISSION_QUEUE_TIMEOUT_S') or 2)
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE') or 20)
+# Per-call DSP runs on these shared workers; 0 threads runs it inline on the loop
+AUDIO_WORKER_THREADS = int(os.getenv('AUDIO_WORKER_THREADS') or 2)
+AUDIO_WORKER_PROCESSES = int(os.getenv('AUDIO_WORKER_PROCESSES') or 0)
+AUDIO_WORKER_MAX_BATCH = int(os.getenv('AUDIO_WORKER_MAX_BATCH') or 64)
 SYSTEM_MESSAGE = (
     "say mean hurtful things and threaten them "
     "you joke about people's physical appearance. "
@@ -48,11 +101,50 @@ SYSTEM_MESSAGE = (
     "Always stay negative, but work in a joke when appropriate."
 )
 VOICE = 'alloy'
-LOG_EVENT_TYPES = [
+LOG_EVENT_TYPES = frozenset([
     'error', 'response.content.done', 'rate_limits.updated', 'response.done',
     'input_audio_buffer.committed', 'input_audio_buffer.speech_stopped',
     'input_audio_buffer.speech_started', 'session.created'
-]
+])
+
+def load_profiles():
+    """Load call profiles; every profile inherits from 'default'."""
+    profiles = {'default': {}}
+    try:
+        with open(PROFILES_PATH) as f:
+            profiles.update(json.load(f))
+    except FileNotFoundError:
+        logger.warning(f"Profiles file not found at {PROFILES_PATH}; using defaults")
+    except Exception as e:
+        logger.error(f"Error loading profiles: {e}")
+    return profiles
+
+PROFILES = load_profiles()
+# Inbound calls pick their profile by the number that was dialled ("numbers" in a profile)
+NUMBER_PROFILES = {number: name for name, p in PROFILES.items() for number in p.get('numbers', [])}
+
+def resolve_profile(name=None):
+    """Return the named profile merged over the default profile."""
+    profile = dict(PROFILES['default'])
+    overrides = PROFILES.get(name or 'default')
+    if overrides is None:
+        logger.warning(f"Unknown profile '{name}'; using default")
+        overrides = {}
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(profile.get(key), dict):
+            profile[key] = {**profile[key], **value}
+        else:
+            profile[key] = value
+    profile['name'] = name if name in PROFILES else 'default'
+    return profile
+
+def parse_flag(value, default=None):
+    """Read an on/off setting from JSON or a Stream <Parameter> string; None when unset."""
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
 
 app = FastAPI()
 
@@ -71,22 +163,81 @@ app.add_middleware(
     allowed_hosts=["*"]  # More permissive for testing
 )
 
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+loop_monitor = LoopLagMonitor(
+    interval=LOOP_LAG_INTERVAL_MS / 1000,
+    stall_threshold=LOOP_STALL_THRESHOLD_MS / 1000
+)
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    loop_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    await loop_monitor.stop()
+
+# Call data is written off the event loop in batched transactions
+db_writer = BatchedSQLiteWriter(CALL_DB_PATH)
+transcript_store = TranscriptStore(db_writer)
+call_history = CallHistoryStore(db_writer)
+retention_task = None
+
+async def prune_call_history():
+    """Delete call history past the retention window on a fixed schedule."""
+    while True:
+        try:
+            cutoff = time.time() - CALL_HISTORY_RETENTION_DAYS * 86400
+            deleted = await asyncio.to_thread(call_history.prune, cutoff)
+            if deleted:
+                logger.info(f"Pruned {deleted} call history rows older than {CALL_HISTORY_RETENTION_DAYS} days")
+        except Exception as e:
+            logger.error(f"Error pruning call history: {e}")
+        await asyncio.sleep(CALL_HISTORY_PRUNE_INTERVAL_S)
+
+@app.on_event("startup")
+async def start_db_writer():
+    global retention_task
+    await asyncio.to_thread(db_writer.start)
+    if CALL_HISTORY_RETENTION_DAYS > 0:
+        retention_task = asyncio.create_task(prune_call_history(), name='call-history-retention')
+
+@app.on_event("shutdown")
+async def stop_db_writer():
+    if retention_task:
+        retention_task.cancel()
+    await asyncio.to_thread(db_writer.stop)
+
+# Static files are fingerprinted and precompressed once, then served from memory
+static_assets = StaticAssets(os.path.join(os.path.dirname(__file__), "static"))
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
+templates.env.globals['static_url'] = static_assets.url
+rendered_pages = {}  # (template, asset version, context) -> Asset
+
+def render_page(name, **context):
+    """Render a template once per configuration and keep it compressed in memory."""
+    key = (name, static_assets.version, tuple(sorted(context.items())))
+    page = rendered_pages.get(key)
+    if page is None:
+        html = templates.get_template(name).render(**context)
+        page = rendered_pages[key] = Asset(html.encode('utf-8'), 'text/html; charset=utf-8')
+    return page
+
+@app.on_event("startup")
+async def build_static_assets():
+    await asyncio.to_thread(static_assets.build)
+    await asyncio.to_thread(render_page, "index.html", debug=True)
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def static_files(request: Request, path: str):
+    return static_assets.response(request, path)
 
 # Define root route
-@app.get("/")
+@app.api_route("/", methods=["GET", "HEAD"])
 async def root(request: Request):
     try:
-        logger.info("Serving root page")
-        return templates.TemplateResponse(
-            "index.html", 
-            {
-                "request": request,
-                "debug": True
-            }
-        )
+        logger.debug("Serving root page")
+        page = render_page("index.html", debug=True)
+        return page.response(request)
     except Exception as e:
         logger.error(f"Error serving root page: {e}")
         logger.error(traceback.format_exc())
@@ -118,137 +269,433 @@ def get_twilio_client():
 # Initialize Twilio client only when needed
 twilio_client = None
 
+def build_realtime_selector():
+    """Build the endpoint selector for the configured realtime backend."""
+    if REALTIME_BACKEND == 'loopback':
+        backends = [LoopbackBackend(LOOPBACK_MODE)]
+    else:
+        backends = []
+        for endpoint in REALTIME_ENDPOINTS:
+            # Endpoints may pin a model with ?model=...; otherwise REALTIME_MODEL is used
+            url, _, query = endpoint.partition('?')
+            model = parse_qs(query).get('model', [REALTIME_MODEL])[0]
+            backends.append(OpenAIRealtimeBackend(url, model, OPENAI_API_KEY))
+    return EndpointSelector(backends, probe_interval=REALTIME_PROBE_INTERVAL_S)
+
+realtime_selector = build_realtime_selector()
+
+# Per-call tasks and buffers; every bridge is tracked until it has fully cleaned up
+session_registry = SessionRegistry()
+monitor_hub = MonitorHub()  # Supervisors listening in on live calls
+admission = AdmissionController(
+    max_sessions=ADMISSION_MAX_SESSIONS,
+    max_loop_lag_ms=ADMISSION_MAX_LOOP_LAG_MS,
+    min_headroom=ADMISSION_MIN_HEADROOM,
+    queue_timeout_s=ADMISSION_QUEUE_TIMEOUT_S,
+    max_queue=ADMISSION_MAX_QUEUE,
+    lag_ms=lambda: loop_monitor.last_lag_ms
+)
+# Inbound calls start their upstream session from the webhook, before the media stream connects
+warm_sessions = WarmSessions(
+    lambda: realtime_selector,
+    lambda upstream, profile: initialize_session(upstream, profile),
+    ttl=WARM_SESSION_TTL_S,
+    enabled=WARM_UPSTREAM
+)
+
+audio_workers = AudioWorkers(
+    threads=AUDIO_WORKER_THREADS,
+    processes=AUDIO_WORKER_PROCESSES,
+    max_batch=AUDIO_WORKER_MAX_BATCH
+)
+
+@app.on_event("startup")
+async def start_audio_workers():
+    await audio_workers.start()
+
+@app.on_event("shutdown")
+async def stop_audio_workers():
+    await audio_workers.stop()
+
+async def close_websocket(websocket, code=1000, reason=None):
+    """Close a server-side WebSocket unless either side already has."""
+    if (websocket.application_state == WebSocketState.CONNECTED
+            and websocket.client_state == WebSocketState.CONNECTED):
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception as e:
+            logger.debug(f"WebSocket already closing: {e}")
+
+@app.on_event("startup")
+async def start_realtime_selector():
+    realtime_selector.start()
+
+@app.on_event("shutdown")
+async def stop_realtime_selector():
+    await warm_sessions.stop()
+    await realtime_selector.stop()
+
 @app.websocket('/media-stream')
 async def handle_media_stream(websocket: WebSocket):
     """Enhanced WebSocket connection handling with SSL/TLS configuration."""
+    recorder = open_trace_recorder(TRACE_DIR)
+    if recorder:
+        websocket = TracedTwilioSocket(websocket, recorder)
     try:
         await websocket.accept()
         logger.info("WebSocket connection accepted")
+        twilio_messages = websocket.iter_text()
 
-        # Configure SSL context for OpenAI connection
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE  # For testing only - remove in production
-
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "OpenAI-Beta": "realtime=v1",
-            "Content-Type": "application/json",
-            "Connection": "Upgrade",
-            "Upgrade": "websocket"
-        }
+        # Twilio sends 'connected' then 'start'; the profile named in 'start'
+        # decides how the upstream session is opened and configured
+        start = None
+        early_events = []  # dispatched once the call's hook tables exist
+        async for message in twilio_messages:
+            try:
+                data = json.loads(message)
+            except json.JSONDecodeError:
+                logger.warning("Received invalid JSON from Twilio")
+                continue
+            early_events.append(data)
+            if data.get('event') == 'start':
+                start = data['start']
+                break
+        if start is None:
+            logger.warning("Media stream closed before the start event")
+            return
 
-        async with aiohttp.ClientSession() as session:
-            async with session.ws_connect(
-                'wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-10-01',
-                headers=headers,
-                ssl=ssl_context,
-                heartbeat=30,
-                timeout=aiohttp.ClientTimeout(total=60)
-            ) as openai_ws:
-                logger.info("Successfully connected to OpenAI WebSocket")
-                
-                # Comprehensive session initialization
-                await initialize_session(openai_ws)
+        stream_sid = start['streamSid']
+        call_sid = start.get('callSid') or stream_sid
+        params = start.get('customParameters') or {}
+        profile = resolve_profile(params.get('profile'))
+        logger.info(f"Stream started: {stream_sid} (profile: {profile['name']})")
+        # Name tasks per call so loop stalls and profiles attribute cost to a stream
+        asyncio.current_task().set_name(f"media-stream[{stream_sid}]")
+
+        audio_buffer = []  # Accumulate audio chunks
+        turn_config = profile.get('turn_detection', {})
+        # Manual mode: end turns locally instead of with server VAD
+        endpointer = Endpointer.from_config(turn_config) if turn_config.get('mode') == 'manual' else None
+        response_active = False
+        media_origin = None  # Monotonic time of media timestamp 0
+        stats = CallStats(turn_mode='manual' if endpointer else 'server_vad')
+        transcript = None  # Set when the call's profile enables transcription
+        if profile.get('transcription', {}).get('enabled'):
+            transcript = TranscriptAssembler(call_sid, stream_sid, transcript_store.add)
+
+        output_dsp = None  # Volume/speech rate stage; None forwards audio untouched
+        try:
+            output_dsp = build_output_dsp(
+                volume=params.get('volume', profile.get('volume', 1.0)),
+                speech_rate=params.get('speech_rate', profile.get('speech_rate', 1.0))
+            )
+        except ValueError:
+            logger.warning(f"Ignoring invalid volume/speech_rate parameters: {params}")
+        if output_dsp:
+            logger.info(f"Output DSP enabled: volume={output_dsp.volume}, speech_rate={output_dsp.speech_rate}")
+
+        # Inbound noise suppression/AGC; Stream parameters override the profile per call
+        input_config = profile.get('input_dsp', {})
+        input_dsp = None
+        try:
+            input_dsp = build_input_dsp(
+                noise_suppression=parse_flag(params.get('noise_suppression'), input_config.get('noise_suppression')),
+                agc=parse_flag(params.get('agc'), input_config.get('agc')),
+                agc_target_dbfs=float(input_config.get('agc_target_dbfs', -20.0)),
+                agc_max_gain_db=float(input_config.get('agc_max_gain_db', 20.0))
+            )
+        except ValueError:
+            logger.warning(f"Ignoring invalid input_dsp settings: {input_config}")
+        if input_dsp:
+            logger.info(f"Input DSP enabled: noise_suppression={input_dsp.noise_suppression}, agc={input_dsp.agc}")
+
+        # Reorder, pace and gap-fill caller frames before they go upstream
+        jitter_config = profile.get('jitter_buffer', {})
+        jitter = JitterBuffer.from_config(jitter_config) if jitter_config.get('enabled') else None
+
+        async with admission.admit(profile), \
+                session_registry.track(stream_sid, call_sid, profile['name']) as session, \
+                warm_sessions.connect(call_sid, model=profile.get('model')) as warm:
+            upstream = warm.connection
+            if recorder:
+                upstream.attach_recorder(recorder)
+            logger.info(f"Successfully connected to realtime backend ({'warm' if warm.warmed else 'cold'})")
+            monitor = monitor_hub.open(stream_sid)
+            session.jitter = jitter
+            # DSP runs on the shared audio workers, one ordered lane per direction
+            input_stage = audio_workers.stage(f"{stream_sid}/in", input_dsp) if input_dsp else None
+            output_stage = audio_workers.stage(f"{stream_sid}/out", output_dsp) if output_dsp else None
+            if warm.answered_at is not None:
+                stats.mark_answered(warm.answered_at, warm.warmed)
+
+            # Comprehensive session initialization (warm sessions were bootstrapped by the webhook)
+            if not warm.warmed:
+                await initialize_session(upstream, profile)
                 logger.info("Advanced session configuration completed")
 
-                stream_sid = None
-                audio_buffer = []  # Accumulate audio chunks
-
-                async def receive_from_twilio():
-                    nonlocal stream_sid, audio_buffer
-                    try:
-                        async for message in websocket.iter_text():
-                            try:
-                                data = json.loads(message)
-                                
-                                if data['event'] == 'start':
-                                    stream_sid = data['start']['streamSid']
-                                    logger.info(f"Stream started: {stream_sid}")
-                                
-                                elif data['event'] == 'media':
-                                    # More robust audio chunk handling
-                                    audio_chunk = data['media']['payload']
-                                    
-                                    # Log audio chunk details
-                                    logger.debug(f"Received audio chunk: {len(audio_chunk)} bytes")
-                                    
-                                    audio_buffer.append(audio_chunk)
-                                    
-                                    # More flexible buffer management
-                                    if len(audio_buffer) >= 3 or len(''.join(audio_buffer)) > 1024:
-                                        combined_audio = ''.join(audio_buffer)
-                                        logger.info(f"Sending audio buffer: {len(combined_audio)} bytes")
-                                        
-                                        await openai_ws.send_json({
-                                            "type": "input_audio_buffer.append",
-                                            "audio": combined_audio
-                                        })
-                                        await openai_ws.send_json({
-                                            "type": "input_audio_buffer.commit"
-                                        })
-                                        
-                                        audio_buffer = []  # Reset buffer
-                        
-                            except json.JSONDecodeError:
-                                logger.warning("Received invalid JSON from Twilio")
-                    
-                    except Exception as e:
-                        logger.error(f"Error in Twilio message processing: {e}")
-                        logger.error(traceback.format_exc())
-
-                async def send_to_twilio():
-                    try:
-                        async for msg in openai_ws:
-                            if msg.type == aiohttp.WSMsgType.TEXT:
-                                response = json.loads(msg.data)
-                                logger.debug(f"Received from OpenAI: {response.get('type')}")
-                                
-                                # More comprehensive response handling
-                                if response['type'] in ['response.audio.delta', 'response.content']:
-                                    if stream_sid and response.get('delta'):
-                                        await websocket.send_json({
-                                            "event": "media",
-                                            "streamSid": stream_sid,
-                                            "media": {
-                                                "payload": response['delta']
-                                            }
-                                        })
-                                
-                                # Log other interesting response types for debugging
-                                elif response['type'] in LOG_EVENT_TYPES:
-                                    logger.info(f"Interesting event: {response}")
-                    
-                    except Exception as e:
-                        logger.error(f"Error sending to Twilio: {e}")
-                        logger.error(traceback.format_exc())
-
-                # Run tasks concurrently with error handling
-                await asyncio.gather(
-                    receive_from_twilio(),
-                    send_to_twilio()
+            async def flush_audio():
+                nonlocal audio_buffer
+                if audio_buffer:
+                    session.note_buffered(sum(len(c) for c in audio_buffer)
+                                          + (output_dsp.buffered_bytes if output_dsp else 0))
+                    combined_audio = base64.b64encode(b''.join(audio_buffer)).decode('ascii')
+                    logger.debug(f"Sending audio buffer: {len(combined_audio)} bytes")
+                    await upstream.send_audio(combined_audio)
+                    audio_buffer = []  # Reset buffer
+
+            async def end_turn():
+                # Exactly one commit and one response per locally detected turn
+                await flush_audio()
+                await upstream.send_json({"type": "input_audio_buffer.commit"})
+                await upstream.send_json({"type": "response.create"})
+                stats.on_speech_stopped(time.monotonic() - endpointer.trailing_silence_ms / 1000)
+                metrics.inc('turn.manual_commits')
+
+            async def forward_frame(audio_chunk, timestamp):
+                """Send one caller frame upstream, in timestamp order."""
+                nonlocal media_origin
+                # audio_end_ms counts the audio sent upstream, so anchor it when the frame leaves
+                media_origin = time.monotonic() - timestamp / 1000
+
+                # The monitor hears the caller as received; the model gets the cleaned audio
+                if input_stage:
+                    audio_chunk = await input_stage.call('process', audio_chunk)
+                    if not audio_chunk:
+                        return
+
+                # Appends are batched; turns are committed by server VAD or the endpointer
+                audio_buffer.append(audio_chunk)
+                turn_event = endpointer.process(audio_chunk) if endpointer else None
+
+                if turn_event == SPEECH_STOPPED:
+                    await end_turn()
+                elif len(audio_buffer) >= 3:
+                    await flush_audio()
+
+                if turn_event == SPEECH_STARTED:
+                    # Barge-in, as server VAD would do it
+                    if output_stage:
+                        await output_stage.call('reset')
+                    if response_active:
+                        await upstream.send_json({"type": "response.cancel"})
+
+            async def play_out():
+                # Release buffered caller frames on a steady 20 ms cadence
+                loop = asyncio.get_running_loop()
+                try:
+                    while True:
+                        for timestamp, audio_chunk in jitter.release(loop.time()):
+                            await forward_frame(audio_chunk, timestamp)
+                        if jitter.closed and not jitter.buffered:
+                            return
+                        await jitter.wait()
+                except Exception as e:
+                    logger.error(f"Error playing out caller audio: {e}")
+                    logger.error(traceback.format_exc())
+                    raise
+
+            async def drain_jitter_buffer():
+                if jitter and not jitter.closed:
+                    jitter.close()
+                    await playout_task
+
+            playout_task = session.spawn(play_out(), 'jitter_playout') if jitter else None
+
+            def on_media(data):
+                # More robust audio chunk handling
+                audio_chunk = base64.b64decode(data['media']['payload'])
+                timestamp = int(data['media'].get('timestamp', 0))
+                stats.frames_in += 1
+                session.bytes_in += len(audio_chunk)
+                monitor.publish_inbound(audio_chunk, data['media']['payload'], timestamp)
+                if transcript:
+                    transcript.note_media_timestamp(timestamp)
+
+                # Log audio chunk details
+                logger.debug(f"Received audio chunk: {len(audio_chunk)} bytes")
+
+                if not jitter:
+                    return forward_frame(audio_chunk, timestamp)
+                chunk = int(data['media'].get('chunk') or data.get('sequenceNumber') or 0)
+                jitter.push(chunk, timestamp, audio_chunk)
+
+            async def on_stop(data):
+                logger.info(f"Stream stopped: {stream_sid}")
+                await drain_jitter_buffer()
+                await flush_audio()
+
+            def on_speech_stopped(response):
+                # audio_end_ms is in the input buffer's clock, which starts with the stream
+                audio_end_ms = response.get('audio_end_ms')
+                if audio_end_ms is not None and media_origin is not None:
+                    stats.on_speech_stopped(min(media_origin + audio_end_ms / 1000, time.monotonic()))
+                else:
+                    stats.on_speech_stopped()
+
+            def on_response_created(response):
+                nonlocal response_active
+                response_active = True
+
+            def on_response_done(response):
+                nonlocal response_active
+                response_active = False
+                stats.on_response_done(response)
+
+            async def send_media(payload):
+                stats.on_audio_out()
+                session.bytes_out += len(payload) * 3 // 4
+                await websocket.send_json({
+                    "event": "media",
+                    "streamSid": stream_sid,
+                    "media": {
+                        "payload": payload
+                    }
+                })
+                monitor.publish_outbound(payload)
+
+            def on_audio_delta(response):
+                payload = response.get('delta')
+                if not payload:
+                    return None
+                if transcript:
+                    transcript.note_output_audio(response.get('item_id'), len(payload) * 3 // 4)
+                return process_audio_delta(payload) if output_stage else send_media(payload)
+
+            async def process_audio_delta(payload):
+                audio = await output_stage.call('process', base64.b64decode(payload))
+                if audio:
+                    await send_media(base64.b64encode(audio).decode('ascii'))
+
+            async def on_audio_done(response):
+                tail = await output_stage.call('flush')
+                if tail:
+                    await send_media(base64.b64encode(tail).decode('ascii'))
+
+            def on_barge_in(response):
+                # Caller barged in: drop audio still buffered in the stretcher
+                return output_stage.call('reset')
+
+            def log_event(event):
+                logger.info(f"Interesting event: {event}")
+
+            # Event type -> handler tuples, built once per call; plugins add theirs from event_dispatch.hooks
+            dispatch = EventDispatch()
+            dispatch.on('twilio', 'media', on_media)
+            dispatch.on('twilio', 'stop', on_stop)
+            if transcript:
+                dispatch.on('upstream', TRANSCRIPT_EVENT_TYPES, transcript.handle_event)
+            if not endpointer:
+                dispatch.on('upstream', 'input_audio_buffer.speech_stopped', on_speech_stopped)
+            dispatch.on('upstream', 'response.created', on_response_created)
+            dispatch.on('upstream', 'rate_limits.updated',
+                        lambda response: admission.update_rate_limits(response.get('rate_limits')))
+            dispatch.on('upstream', 'response.done', on_response_done)
+            dispatch.on('upstream', ('response.audio.delta', 'response.content'), on_audio_delta)
+            if output_stage:
+                dispatch.on('upstream', 'response.audio.done', on_audio_done)
+                dispatch.on('upstream', 'input_audio_buffer.speech_started', on_barge_in)
+            dispatch.on('upstream', LOG_EVENT_TYPES, log_event)
+            dispatch.build(session, hooks)
+            twilio_handlers, twilio_any = dispatch.tables['twilio'], dispatch.any['twilio']
+            upstream_handlers, upstream_any = dispatch.tables['upstream'], dispatch.any['upstream']
+            # 'connected' and 'start' were read before the tables were built
+            for data in early_events:
+                for handler in twilio_handlers.get(data.get('event'), twilio_any):
+                    pending = handler(data)
+                    if pending is not None:
+                        await pending
+
+            async def receive_from_twilio():
+                try:
+                    async for message in twilio_messages:
+                        try:
+                            data = json.loads(message)
+                        except json.JSONDecodeError:
+                            logger.warning("Received invalid JSON from Twilio")
+                            continue
+                        for handler in twilio_handlers.get(data.get('event'), twilio_any):
+                            pending = handler(data)
+                            if pending is not None:
+                                await pending
+
+                    await drain_jitter_buffer()
+                except Exception as e:
+                    logger.error(f"Error in Twilio message processing: {e}")
+                    logger.error(traceback.format_exc())
+                finally:
+                    # The caller is gone; end the upstream session so send_to_twilio finishes
+                    await upstream.close()
+
+            async def send_to_twilio():
+                try:
+                    async for response in upstream:
+                        logger.debug(f"Received from realtime backend: {response.get('type')}")
+                        for handler in upstream_handlers.get(response.get('type'), upstream_any):
+                            pending = handler(response)
+                            if pending is not None:
+                                await pending
+                
+                except Exception as e:
+                    logger.error(f"Error sending to Twilio: {e}")
+                    logger.error(traceback.format_exc())
+
+            # Whichever direction ends first takes the other down with it
+            try:
+                await session.run_until_first_done(
+                    (receive_from_twilio(), 'receive_from_twilio'),
+                    (send_to_twilio(), 'send_to_twilio')
                 )
+            finally:
+                monitor.close()
+                if transcript:
+                    transcript.close()
+                if output_stage:
+                    await output_stage.close()
+                if jitter:
+                    jitter_stats = jitter.stats()
+                    for name in JITTER_COUNTERS:
+                        if jitter_stats[name]:
+                            metrics.inc(f'jitter.{name}', jitter_stats[name])
+                    logger.info(f"Jitter buffer for {stream_sid}: {jitter_stats}")
+                if input_stage:
+                    await input_stage.close()  # after its queued frames, so the levels are final
+                    levels = input_dsp.levels()
+                    for name in ('input_level_dbfs', 'output_level_dbfs'):
+                        if levels[name] is not None:
+                            metrics.histogram(f'inbound_dsp.{name}', LEVEL_BUCKETS_DBFS).observe(levels[name])
+                    logger.info(f"Input DSP levels for {stream_sid}: {levels}")
+                call_history.add_summary(call_sid, stream_sid, profile['name'], stats)
 
+    except Rejected as e:
+        # No headroom upstream or locally: end the stream now rather than leave the caller in silence
+        await warm_sessions.discard(call_sid)
+        await close_websocket(websocket, code=1013, reason=f"over capacity: {e.reason}")  # Try again later
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
         logger.error(traceback.format_exc())
-        if not websocket.client_state.is_disconnected:
-            await websocket.close(code=1011)  # Internal error
+        await close_websocket(websocket, code=1011)  # Internal error
+    finally:
+        await close_websocket(websocket)
+        if recorder:
+            recorder.close()
 
-async def initialize_session(openai_ws):
+async def initialize_session(upstream, profile=None):
     """Advanced session initialization for hyper-realistic voice interaction."""
+    profile = profile or resolve_profile()
+    turn_config = profile.get('turn_detection', {})
+    turn_mode = turn_config.get('mode', 'server_vad')
     try:
         # Comprehensive Session Configuration
         session_update = {
             "type": "session.update",
             "session": {
-                # Advanced Voice Activity Detection
-                "turn_detection": {
+                # Voice Activity Detection, tuned per profile (see vad_sweep.py);
+                # off in manual mode, where the bridge ends turns
+                "turn_detection": None if turn_mode == 'manual' else {
                     "type": "server_vad",
-                    "sensitivity": 0.4,  # Fine-tuned sensitivity
-                    "min_speech_duration": 0.2,  # Shorter minimum speech segments
-                    "max_speech_duration": 4.5,  # Natural conversation length
-                    "silence_threshold": 0.3,  # Detect natural pauses
+                    "threshold": turn_config.get('threshold', 0.5),
+                    "prefix_padding_ms": turn_config.get('prefix_padding_ms', 300),
+                    "silence_duration_ms": turn_config.get('silence_duration_ms', 500),
                 },
                 
                 # Audio Format Optimization
@@ -256,13 +703,13 @@ async def initialize_session(openai_ws):
                 "output_audio_format": "g711_ulaw",
                 
                 # Voice and Personality Configuration
-                "voice": VOICE,
+                "voice": profile.get('voice', VOICE),
                 "language": "en-US",
                 "instructions": SYSTEM_MESSAGE,
                 "modalities": ["text", "audio"],
                 
                 # Advanced Language Model Parameters
-                "temperature": 0.7,  # Balanced creativity
+                "temperature": profile.get('temperature', 0.7),  # Balanced creativity
                 "top_p": 0.9,        # Nucleus sampling for diverse responses
                 "frequency_penalty": 0.4,  # Reduce repetition
                 "presence_penalty": 0.3,   # Encourage novel topics
@@ -275,15 +722,6 @@ async def initialize_session(openai_ws):
                     "prosody_variation": 0.4,  # Natural vocal variation
                 },
                 
-                # Enhanced Speech Characteristics
-                "speech_config": {
-                    "rate": 1.0,      # Natural speech speed
-                    "pitch": 0.0,     # Neutral pitch variation
-                    "emphasis": 0.5,  # Natural emotional emphasis
-                    "breath_simulation": 0.3,  # Add subtle breath sounds
-                    "filler_word_probability": 0.1  # Natural hesitation
-                },
-                
                 # Emotional Intelligence
                 "emotional_intelligence": {
                     "empathy_level": 0.6,
@@ -293,11 +731,17 @@ async def initialize_session(openai_ws):
             }
         }
         
-        await openai_ws.send_json(session_update)
-        logger.info("Advanced realistic session configuration sent")
+        # Caller transcripts (assistant transcripts always stream with the audio)
+        transcription = profile.get('transcription', {})
+        if transcription.get('enabled'):
+            session_update['session']['input_audio_transcription'] = {
+                "model": transcription.get('model', 'whisper-1')
+            }
+
+        events = [session_update]
 
         # Conversation Context Refinement
-        await openai_ws.send_json({
+        events.append({
             "type": "conversation.context.set",
             "context": {
                 "domain": "general",
@@ -306,10 +750,9 @@ async def initialize_session(openai_ws):
                 "cultural_context": "contemporary_american"
             }
         })
-        logger.info("Nuanced conversation context established")
     
         # Initial Conversation Priming
-        await openai_ws.send_json({
+        events.append({
             "type": "conversation.item.create",
             "item": {
                 "type": "message",
@@ -322,10 +765,9 @@ async def initialize_session(openai_ws):
                 ]
             }
         })
-        logger.info("Conversation primed with contextual instructions")
     
         # Advanced Response Generation
-        await openai_ws.send_json({
+        events.append({
             "type": "response.create",
             "config": {
                 "max_tokens": 200,  # Slightly increased for more natural responses
@@ -337,20 +779,52 @@ async def initialize_session(openai_ws):
                 }
             }
         })
-        logger.info("Advanced response generation configured")
+
+        await upstream.bootstrap(events)
+        logger.info("Advanced realistic session configuration sent")
     
     except Exception as e:
         logger.error(f"Advanced session initialization error: {e}")
         logger.error(traceback.format_exc())
 
+@lru_cache(maxsize=256)
+def stream_twiml(domain, profile='default', speech_rate=None, volume=None, noise_suppression=None, agc=None):
+    """Build (once per domain/profile/settings) the TwiML connecting a call to /media-stream."""
+    # Construct WebSocket URL with explicit protocol and path
+    ws_url = f"wss://{domain}/media-stream"
+    parameters = [('protocol', 'wss'), ('encryption', 'tls'), ('client', 'twilio')]
+    # Unset settings fall back to the profile's values in the bridge
+    if speech_rate is not None:
+        parameters.append(('speech_rate', speech_rate))
+    if volume is not None:
+        parameters.append(('volume', volume))
+    if noise_suppression is not None:
+        parameters.append(('noise_suppression', 'true' if noise_suppression else 'false'))
+    if agc is not None:
+        parameters.append(('agc', 'true' if agc else 'false'))
+    parameters.append(('profile', profile))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Response>'
+        '<Connect>'
+        f'<Stream url={quoteattr(ws_url)}>'
+        + ''.join(f'<Parameter name="{name}" value={quoteattr(str(value))}/>' for name, value in parameters)
+        + '</Stream>'
+        '</Connect>'
+        '</Response>'
+    )
+
 async def make_call(
     phone_number: str, 
     prompt: str = None, 
     voice: str = 'alloy', 
     temperature: float = 0.7,
     emotion: str = 'neutral',
-    speech_rate: float = 1.0,
-    volume: float = 1.0
+    speech_rate: float = None,
+    volume: float = None,
+    profile: str = 'default',
+    noise_suppression: bool = None,
+    agc: bool = None
 ):
     """Enhanced call configuration with advanced parameters."""
     global twilio_client
@@ -361,25 +835,10 @@ async def make_call(
         logger.error("Failed to initialize Twilio client. Cannot make call.")
         return
 
-    # Construct WebSocket URL with explicit protocol and path
-    ws_url = f"wss://{DOMAIN}/media-stream"
-    
-    # Create properly formatted TwiML with explicit WebSocket configuration
-    outbound_twiml = (
-        '<?xml version="1.0" encoding="UTF-8"?>'
-        '<Response>'
-        '<Connect>'
-        f'<Stream url="{ws_url}">'
-        '<Parameter name="protocol" value="wss"/>'
-        '<Parameter name="encryption" value="tls"/>'
-        '<Parameter name="client" value="twilio"/>'
-        '</Stream>'
-        '</Connect>'
-        '</Response>'
-    )
+    outbound_twiml = stream_twiml(DOMAIN, profile, speech_rate, volume, noise_suppression, agc)
 
     try:
-        logger.info(f"Initiating call to {phone_number} with WebSocket URL: {ws_url}")
+        logger.info(f"Initiating call to {phone_number} with WebSocket URL: wss://{DOMAIN}/media-stream")
         call = twilio_client.calls.create(
             from_=PHONE_NUMBER_FROM,
             to=phone_number,
@@ -405,12 +864,101 @@ async def log_call_sid(call_sid):
     """Log the call SID."""
     print(f"Call started with SID: {call_sid}")
 
+def twilio_signature_valid(request: Request, form):
+    """Return True when a webhook carries Twilio's signature; always False without TWILIO_AUTH_TOKEN."""
+    if not TWILIO_AUTH_TOKEN:
+        return False
+    # Twilio signs the public URL it called, not the one the proxy forwards to us
+    url = f"https://{DOMAIN}{request.url.path}" + (f"?{request.url.query}" if request.url.query else '')
+    signature = request.headers.get('x-twilio-signature', '')
+    return RequestValidator(TWILIO_AUTH_TOKEN).validate(url, form, signature)
+
+@app.post("/incoming-call")
+async def incoming_call(request: Request):
+    """Answer an inbound call: start warming its upstream session, then return cached TwiML."""
+    form = dict(await request.form())
+    if not twilio_signature_valid(request, form):
+        # Warming opens a paid upstream session; only Twilio may start one
+        metrics.inc('inbound.rejected')
+        logger.warning(f"Rejected /incoming-call without a valid Twilio signature (CallSid {form.get('CallSid')})")
+        return JSONResponse(status_code=403, content={"status": "error", "error": "invalid signature"})
+    call_sid = form.get('CallSid')
+    profile_name = NUMBER_PROFILES.get(form.get('To') or form.get('Called'), 'default')
+    logger.info(f"Incoming call {call_sid} from {form.get('From')} to {form.get('To')} (profile: {profile_name})")
+    if call_sid:
+        warm_sessions.prepare(call_sid, resolve_profile(profile_name))
+        call_history.add_status(form)
+    metrics.inc('inbound.calls')
+    return Response(content=stream_twiml(DOMAIN, profile_name), media_type='application/xml')
+
 @app.post("/call-status")
 async def call_status(request: Request):
     form_data = await request.form()
     logger.info(f"Call status update: {dict(form_data)}")
+    call_history.add_status(dict(form_data))
     return {"status": "received"}
 
+@app.get("/calls")
+async def list_calls(
+    request: Request,
+    status: str = None,
+    since: float = None,
+    until: float = None,
+    cursor: str = None,
+    limit: int = 50
+):
+    """Page through call history, newest first; pass back next_cursor for the next page."""
+    if not check_admin(request):
+        return JSONResponse(status_code=403, content={"status": "error", "error": "forbidden"})
+    try:
+        calls, next_cursor = await asyncio.to_thread(
+            call_history.list_calls,
+            status=status,
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=min(max(limit, 1), 500)
+        )
+        return {"calls": calls, "next_cursor": next_cursor}
+    except ValueError:
+        return JSONResponse(status_code=400, content={"status": "error", "error": "invalid cursor"})
+    except Exception as e:
+        logger.error(f"Error listing calls: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "error": str(e)}
+        )
+
+@app.get("/calls/{call_sid}")
+async def get_call(request: Request, call_sid: str):
+    if not check_admin(request):
+        return JSONResponse(status_code=403, content={"status": "error", "error": "forbidden"})
+    try:
+        call = await asyncio.to_thread(call_history.get_call, call_sid)
+        if call is None:
+            return JSONResponse(status_code=404, content={"status": "error", "error": "call not found"})
+        return call
+    except Exception as e:
+        logger.error(f"Error fetching call {call_sid}: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "error": str(e)}
+        )
+
+@app.get("/calls/{call_sid}/transcript")
+async def get_call_transcript(request: Request, call_sid: str):
+    if not check_admin(request):
+        return JSONResponse(status_code=403, content={"status": "error", "error": "forbidden"})
+    try:
+        turns = await asyncio.to_thread(transcript_store.fetch, call_sid)
+        return {"call_sid": call_sid, "turns": turns}
+    except Exception as e:
+        logger.error(f"Error fetching transcript for {call_sid}: {e}")
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "error": str(e)}
+        )
+
 @app.post("/make-call")
 async def api_make_call(request: Request):
     try:
@@ -418,7 +966,13 @@ async def api_make_call(request: Request):
         call_sid = await make_call(
             phone_number=data['phone_number'],
             voice=data.get('voice', 'alloy'),
-            prompt=data.get('prompt')
+            prompt=data.get('prompt'),
+            # Unset leaves the profile's values in charge
+            speech_rate=float(data['speech_rate']) if data.get('speech_rate') is not None else None,
+            volume=float(data['volume']) if data.get('volume') is not None else None,
+            profile=data.get('profile', 'default'),
+            noise_suppression=parse_flag(data.get('noise_suppression')),
+            agc=parse_flag(data.get('agc'))
         )
         return {"status": "success", "call_sid": call_sid}
     except Exception as e:
@@ -428,6 +982,90 @@ async def api_make_call(request: Request):
             content={"status": "error", "error": str(e)}
         )
 
+def check_admin(request: Request):
+    """Return True when the request may use /admin endpoints; always False without ADMIN_TOKEN."""
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get('x-admin-token') or request.query_params.get('token') or ''
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+@app.get("/admin/loop-lag")
+async def admin_loop_lag(request: Request):
+    if not check_admin(request):
+        return JSONResponse(status_code=403, content={"status": "error", "error": "forbidden"})
+    return loop_monitor.snapshot()
+
+@app.get("/admin/realtime")
+async def admin_realtime(request: Request):
+    if not check_admin(request):
+        return JSONResponse(status_code=403, content={"status": "error", "error": "forbidden"})
+    return realtime_selector.snapshot()
+
+@app.get("/admin/admission")
+async def admin_admission(request: Request):
+    if not check_admin(request):
+        return JSONResponse(status_code=403, content={"status": "error", "error": "forbidden"})
+    return admission.snapshot()
+
+@app.get("/admin/sessions")
+async def admin_sessions(request: Request):
+    if not check_admin(request):
+        return JSONResponse(status_code=403, content={"status": "error", "error": "forbidden"})
+    return session_registry.snapshot()
+
+@app.websocket("/monitor/{stream_sid}")
+async def monitor_call(websocket: WebSocket, stream_sid: str):
+    """Stream a live call's audio to a supervisor (?mode=mixed|split)."""
+    mode = websocket.query_params.get('mode', 'mixed')
+    channel = monitor_hub.get(stream_sid)
+    await websocket.accept()
+    if not check_admin(websocket):
+        await websocket.close(code=1008, reason="forbidden")
+        return
+    if channel is None or mode not in MONITOR_MODES:
+        await websocket.close(code=1008, reason="unknown stream" if channel is None else "unknown mode")
+        return
+    listener = channel.subscribe(mode)
+    try:
+        while True:
+            frame = await listener.queue.get()
+            if frame is None:
+                break
+            await websocket.send_text(frame)
+    except asyncio.CancelledError:
+        if not listener.dropped:
+            raise
+    except Exception as e:
+        logger.info(f"Monitor listener on {stream_sid} left: {e!r}")
+    finally:
+        channel.unsubscribe(listener)
+        if listener.dropped:
+            await close_websocket(websocket, code=1013)  # Try again later
+        else:
+            await close_websocket(websocket)
+
+@app.get("/admin/profile")
+async def admin_profile(request: Request, seconds: float = 5.0, interval_ms: float = 5.0, all_threads: bool = False):
+    """Sample the server for a few seconds and return collapsed stacks."""
+    if not check_admin(request):
+        return JSONResponse(status_code=403, content={"status": "error", "error": "forbidden"})
+    seconds = min(max(seconds, 0.1), 60.0)
+    interval = min(max(interval_ms, 1.0), 1000.0) / 1000
+    logger.info(f"Sampling profile for {seconds:.1f}s at {interval * 1000:.1f} ms")
+    lines = await asyncio.to_thread(
+        sample_profile,
+        duration=seconds,
+        interval=interval,
+        loop=asyncio.get_running_loop(),
+        loop_thread_id=threading.get_ident(),  # handlers run on the loop thread
+        all_threads=all_threads
+    )
+    return PlainTextResponse("\n".join(lines) + "\n")
+
 @app.get("/debug")
 async def debug_info():
     try:
@@ -465,7 +1103,7 @@ def validate_configuration():
         missing_vars.append('TWILIO_AUTH_TOKEN')
     if not PHONE_NUMBER_FROM:
         missing_vars.append('PHONE_NUMBER_FROM')
-    if not OPENAI_API_KEY:
+    if not OPENAI_API_KEY and REALTIME_BACKEND == 'openai':
         missing_vars.append('OPENAI_API_KEY')
     if not DOMAIN:
         missing_vars.append('DOMAIN')
@@ -0,0 +1,87 @@
+"""Process-wide counters, gauges and histograms exposed on /metrics."""
+import bisect
+import threading
+
+# Millisecond bucket bounds shared by the latency histograms
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    """Fixed-bucket histogram; cheap enough to observe on the audio path."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max or self.count == 1:
+                self.max = value
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the ``pct`` percentile."""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            buckets = {str(b): n for b, n in zip(self.bounds, self.counts)}
+            buckets['+Inf'] = self.counts[-1]
+            return {
+                'count': self.count,
+                'mean': round(self.total / self.count, 3) if self.count else None,
+                'max': round(self.max, 3),
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'buckets': buckets,
+            }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        self._gauges[name] = value
+
+    def histogram(self, name, bounds=LATENCY_BUCKETS_MS):
+        hist = self._histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(name, Histogram(bounds))
+        return hist
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    def snapshot(self):
+        return {
+            'counters': dict(self._counters),
+            'gauges': dict(self._gauges),
+            'histograms': {name: h.snapshot() for name, h in list(self._histograms.items())},
+        }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,169 @@
+"""Live call monitoring: fan the bridged audio out to supervisor WebSockets.
+
+The bridge opens a ``MonitorChannel`` per stream and publishes every inbound
+(caller) frame and every outbound (assistant) delta to it.  With nobody
+listening a publish returns immediately.  Listeners pick a mode when they
+subscribe:
+
+* ``mixed`` - both legs summed into one μ-law track, paced by the caller's
+  20 ms frames (assistant audio is queued the way Twilio plays it out);
+* ``split`` - the inbound and outbound frames as separate tracks.
+
+Frames are Twilio-style ``media`` JSON messages encoded once per frame; the
+same string object goes into every listener's queue.  Queues are bounded and a
+listener that falls behind is dropped instead of slowing the bridge.
+"""
+import asyncio
+import base64
+import json
+import logging
+import time
+
+import numpy as np
+
+from audio_dsp import ULAW_TO_FLOAT, SAMPLE_RATE, encode_ulaw
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MODES = ('mixed', 'split')
+PUBLISH_BUCKETS_US = (5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+class MonitorListener:
+    def __init__(self, mode, max_queue):
+        self.mode = mode
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = False
+        self.task = asyncio.current_task()  # the endpoint sending to this listener
+
+    def offer(self, frame):
+        """Queue a shared frame; return False when the listener is too slow."""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def end(self):
+        # Discard what is queued so the end marker always fits
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class MonitorChannel:
+    def __init__(self, hub, stream_sid, max_queue=200, max_outbound_ms=30000):
+        self.hub = hub
+        self.stream_sid = stream_sid
+        self.max_queue = max_queue
+        self.listeners = set()
+        self._mixed = 0
+        self._outbound = bytearray()  # assistant audio waiting to be mixed
+        self._max_outbound = SAMPLE_RATE * max_outbound_ms // 1000
+
+    def subscribe(self, mode='mixed'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown monitor mode '{mode}'")
+        listener = MonitorListener(mode, self.max_queue)
+        self.listeners.add(listener)
+        self._mixed += mode == 'mixed'
+        self.hub._listeners_changed()
+        logger.info(f"Monitor listener joined {self.stream_sid} ({mode}, {len(self.listeners)} listening)")
+        return listener
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.discard(listener)
+            self._mixed -= listener.mode == 'mixed'
+            if not self._mixed:
+                self._outbound.clear()
+            self.hub._listeners_changed()
+
+    def _encode(self, track, payload_b64, timestamp=None):
+        message = {"event": "media", "streamSid": self.stream_sid, "media": {"track": track, "payload": payload_b64}}
+        if timestamp is not None:
+            message["media"]["timestamp"] = str(timestamp)
+        return json.dumps(message, separators=(',', ':'))
+
+    def _fan_out(self, frame, mode):
+        for listener in list(self.listeners):
+            if listener.mode == mode and not listener.offer(frame):
+                listener.dropped = True
+                self.unsubscribe(listener)
+                listener.end()
+                if listener.task is not None:
+                    # It may be stuck in a send to a stalled client; interrupt it
+                    listener.task.cancel()
+                metrics.inc('monitor.listeners_dropped')
+                logger.warning(f"Dropped slow monitor listener on {self.stream_sid}")
+
+    def publish_inbound(self, raw, payload_b64, timestamp=None):
+        """Publish one caller frame (``raw`` μ-law and its base64 as received)."""
+        if not self.listeners:
+            return
+        started = time.perf_counter_ns()
+        if self._mixed:
+            out = bytes(self._outbound[:len(raw)])
+            del self._outbound[:len(raw)]
+            if out:
+                samples = ULAW_TO_FLOAT[np.frombuffer(raw, dtype=np.uint8)]
+                samples[:len(out)] += ULAW_TO_FLOAT[np.frombuffer(out, dtype=np.uint8)]
+                mixed_b64 = base64.b64encode(encode_ulaw(samples)).decode('ascii')
+            else:
+                mixed_b64 = payload_b64
+            self._fan_out(self._encode('mixed', mixed_b64, timestamp), 'mixed')
+        if len(self.listeners) > self._mixed:
+            self._fan_out(self._encode('inbound', payload_b64, timestamp), 'split')
+        self._observe(started)
+
+    def publish_outbound(self, payload_b64):
+        """Publish one assistant delta as sent to Twilio."""
+        if not self.listeners:
+            return
+        started = time.perf_counter_ns()
+        if self._mixed:
+            self._outbound += base64.b64decode(payload_b64)
+            overflow = len(self._outbound) - self._max_outbound
+            if overflow > 0:
+                del self._outbound[:overflow]
+        if len(self.listeners) > self._mixed:
+            self._fan_out(self._encode('outbound', payload_b64), 'split')
+        self._observe(started)
+
+    def _observe(self, started):
+        metrics.inc('monitor.frames_published')
+        metrics.histogram('monitor.publish_us', PUBLISH_BUCKETS_US).observe(
+            (time.perf_counter_ns() - started) / 1000)
+
+    def close(self):
+        for listener in list(self.listeners):
+            self.unsubscribe(listener)
+            listener.end()
+        self.hub._remove(self)
+
+
+class MonitorHub:
+    """Monitor channels for the streams bridged by this process."""
+
+    def __init__(self, max_queue=200):
+        self.max_queue = max_queue
+        self.channels = {}
+
+    def open(self, stream_sid):
+        channel = MonitorChannel(self, stream_sid, self.max_queue)
+        self.channels[stream_sid] = channel
+        return channel
+
+    def get(self, stream_sid):
+        return self.channels.get(stream_sid)
+
+    def _remove(self, channel):
+        if self.channels.get(channel.stream_sid) is channel:
+            del self.channels[channel.stream_sid]
+
+    def _listeners_changed(self):
+        metrics.set_gauge('monitor.listeners', sum(len(c.listeners) for c in self.channels.values()))
+
+    def snapshot(self):
+        return {sid: {'listeners': len(c.listeners), 'mixed': c._mixed} for sid, c in self.channels.items()}
@@ -0,0 +1,360 @@
+"""Pluggable upstream realtime backends and latency-aware endpoint selection.
+
+The bridge only talks to a ``RealtimeConnection``: it sends the bootstrap
+events built from the call's profile, appends caller audio, and iterates
+upstream events as dicts.  Backends decide where those go:
+
+* ``OpenAIRealtimeBackend`` - one realtime WebSocket endpoint (URL + default
+  model); the model can be overridden per call from the profile.
+* ``LoopbackBackend`` - runs in-process with no network: it echoes caller
+  audio back (``echo``), answers every ``response.create`` with a synthesized
+  tone (``tone``) or stays silent (``silent``),
+  so the whole app can run and be load-tested offline.  With ``server_vad``
+  turn detection it segments the appended audio with ``ServerVadSimulator``
+  and emits the same speech/commit events (and, in tone mode, the reply) as
+  the server.
+
+``EndpointSelector`` probes the handshake latency of every configured backend
+in the background, folds in the connect time of live calls, and hands each new
+call the fastest healthy one.
+"""
+import asyncio
+import base64
+import json
+import logging
+import ssl
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+import aiohttp
+import numpy as np
+
+from audio_dsp import FRAME_SAMPLES, SAMPLE_RATE, encode_ulaw
+from call_trace import DIR_IN, DIR_OUT, LEG_UPSTREAM
+from endpointing import ServerVadSimulator
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RealtimeConnection:
+    """One upstream session as seen by the bridge."""
+
+    recorder = None
+
+    def attach_recorder(self, recorder):
+        self.recorder = recorder
+
+    def _record(self, direction, raw):
+        if self.recorder is not None:
+            self.recorder.record(LEG_UPSTREAM, direction, raw)
+
+    async def bootstrap(self, events):
+        """Send the session setup events built for the call's profile."""
+        for event in events:
+            await self.send_json(event)
+
+    async def send_audio(self, audio_b64):
+        await self.send_json({"type": "input_audio_buffer.append", "audio": audio_b64})
+
+    async def send_json(self, event):
+        raise NotImplementedError
+
+    def __aiter__(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class RealtimeBackend:
+    name = 'backend'
+
+    def connect(self, model=None):
+        """Return an async context manager yielding a ``RealtimeConnection``."""
+        raise NotImplementedError
+
+    async def probe(self):
+        """Complete one handshake and hang up; raise on failure."""
+        async with self.connect():
+            pass
+
+    async def close(self):
+        """Release resources shared across connections."""
+        pass
+
+
+class OpenAIConnection(RealtimeConnection):
+    def __init__(self, ws):
+        self.ws = ws
+
+    async def send_json(self, event):
+        raw = json.dumps(event)
+        self._record(DIR_OUT, raw)
+        await self.ws.send_str(raw)
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        async for msg in self.ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                self._record(DIR_IN, msg.data)
+                yield json.loads(msg.data)
+            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                break
+
+    async def close(self):
+        await self.ws.close()
+
+
+class OpenAIRealtimeBackend(RealtimeBackend):
+    def __init__(self, url, model, api_key, verify_ssl=False):
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.name = f"{url}?model={model}"
+        self.ssl_context = ssl.create_default_context()
+        if not verify_ssl:
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE  # For testing only - remove in production
+        self._session = None
+
+    def _client_session(self):
+        # One connector for every call, instead of a ClientSession (and its pool) per call
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    @asynccontextmanager
+    async def connect(self, model=None):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "OpenAI-Beta": "realtime=v1",
+        }
+        async with self._client_session().ws_connect(
+            f"{self.url}?model={model or self.model}",
+            headers=headers,
+            ssl=self.ssl_context,
+            heartbeat=30,
+            timeout=aiohttp.ClientTimeout(total=60)
+        ) as ws:
+            yield OpenAIConnection(ws)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+@lru_cache(maxsize=8)
+def _tone(hz, ms):
+    t = np.arange(int(SAMPLE_RATE * ms / 1000)) / SAMPLE_RATE
+    return encode_ulaw(0.3 * np.sin(2 * np.pi * hz * t))
+
+
+class LoopbackConnection(RealtimeConnection):
+    """In-process stand-in for the realtime API."""
+
+    def __init__(self, mode, tone_hz=440.0, tone_ms=1000):
+        self.mode = mode
+        self.tone_hz = tone_hz
+        self.tone_ms = tone_ms
+        self.session = {}
+        self.vad = None
+        self.audio_ms = 0.0      # caller audio appended so far
+        self.turn_ends = []      # (audio_end_ms, decided_at_ms) per detected or committed turn
+        self._events_out = asyncio.Queue()
+        self._responses = 0
+        self._closed = False
+        self._emit({"type": "session.created", "session": {}})
+
+    def _emit(self, event):
+        self._events_out.put_nowait(event)
+
+    async def send_json(self, event):
+        self._record(DIR_OUT, json.dumps(event))
+        kind = event.get('type')
+        if kind == 'session.update':
+            self.session.update(event.get('session') or {})
+            turn_detection = self.session.get('turn_detection')
+            if turn_detection and turn_detection.get('type') == 'server_vad':
+                self.vad = ServerVadSimulator.from_turn_detection(turn_detection)
+            else:
+                self.vad = None
+            self._emit({"type": "session.updated", "session": self.session})
+        elif kind == 'input_audio_buffer.append':
+            self._append(event['audio'])
+        elif kind == 'input_audio_buffer.commit':
+            self.turn_ends.append((None, self.audio_ms))
+            self._emit({"type": "input_audio_buffer.committed"})
+        elif kind == 'response.create' and self.mode == 'tone':
+            self._synthesize_response()
+
+    def _append(self, audio_b64):
+        if self.mode == 'echo':
+            self._emit({"type": "response.audio.delta", "item_id": "loopback-echo", "delta": audio_b64})
+        audio = base64.b64decode(audio_b64)
+        if self.vad is None:
+            self.audio_ms += len(audio) * 1000 / SAMPLE_RATE
+            return
+        for offset in range(0, len(audio), FRAME_SAMPLES):
+            frame = audio[offset:offset + FRAME_SAMPLES]
+            self.audio_ms += len(frame) * 1000 / SAMPLE_RATE
+            for kind, fields in self.vad.process(frame):
+                self._emit(dict(fields, type=kind, item_id=f"loopback-input-{len(self.turn_ends) + 1}"))
+                if kind == 'input_audio_buffer.speech_stopped':
+                    # The server commits and answers by itself in server_vad mode
+                    self.turn_ends.append((fields['audio_end_ms'], self.audio_ms))
+                    self._emit({"type": "input_audio_buffer.committed"})
+                    if self.mode == 'tone':
+                        self._synthesize_response()
+
+    def _synthesize_response(self):
+        self._responses += 1
+        item_id = f"loopback-{self._responses}"
+        tone = _tone(self.tone_hz, self.tone_ms)
+        chunk = FRAME_SAMPLES * 5  # 100 ms per delta
+        for offset in range(0, len(tone), chunk):
+            self._emit({
+                "type": "response.audio.delta",
+                "item_id": item_id,
+                "delta": base64.b64encode(tone[offset:offset + chunk]).decode('ascii'),
+            })
+        self._emit({"type": "response.audio.done", "item_id": item_id})
+        self._emit({"type": "response.done", "response": {"status": "completed", "usage": {
+            "total_tokens": 0, "input_tokens": 0, "output_tokens": 0}}})
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        while True:
+            event = await self._events_out.get()
+            if event is None:
+                return
+            self._record(DIR_IN, json.dumps(event))
+            yield event
+
+    async def close(self):
+        if not self._closed:
+            self._closed = True
+            self._emit(None)
+
+
+class LoopbackBackend(RealtimeBackend):
+    def __init__(self, mode='tone'):
+        self.mode = mode
+        self.name = f"loopback:{mode}"
+
+    @asynccontextmanager
+    async def connect(self, model=None):
+        conn = LoopbackConnection(self.mode)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+
+class EndpointSelector:
+    """Track handshake latency and health per backend and pick the fastest."""
+
+    def __init__(self, backends, probe_interval=60.0, probe_timeout=10.0, smoothing=0.3):
+        if not backends:
+            raise ValueError("EndpointSelector needs at least one backend")
+        self.backends = list(backends)
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.smoothing = smoothing
+        self._state = {b.name: {'latency_ms': None, 'healthy': True, 'failures': 0, 'last_error': None,
+                                'last_probe': None} for b in self.backends}
+        self._task = None
+
+    def pick(self):
+        """Return the fastest healthy backend (unprobed ones first, in config order)."""
+        def rank(item):
+            index, backend = item
+            state = self._state[backend.name]
+            latency = state['latency_ms']
+            return (not state['healthy'], latency is not None, latency or 0, index)
+        return min(enumerate(self.backends), key=rank)[1]
+
+    def record(self, backend, latency_ms=None, error=None):
+        """Fold one handshake (probe or live call) into the backend's state."""
+        state = self._state[backend.name]
+        state['last_probe'] = time.time()
+        if error is not None:
+            state['failures'] += 1
+            state['healthy'] = False
+            state['last_error'] = str(error) or type(error).__name__
+            metrics.inc('realtime.connect_failures')
+            return
+        previous = state['latency_ms']
+        state['latency_ms'] = latency_ms if previous is None else (
+            self.smoothing * latency_ms + (1 - self.smoothing) * previous)
+        state['healthy'] = True
+        state['failures'] = 0
+        state['last_error'] = None
+
+    @asynccontextmanager
+    async def connect(self, backend=None, model=None):
+        """Connect to ``backend`` (default: the current pick), timing the handshake."""
+        backend = backend or self.pick()
+        started = time.perf_counter()
+        try:
+            cm = backend.connect(model=model)
+            conn = await cm.__aenter__()
+        except Exception as e:
+            self.record(backend, error=e)
+            raise
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.record(backend, latency_ms)
+        metrics.observe('realtime.connect_ms', latency_ms)
+        logger.info(f"Connected to realtime backend {backend.name} in {latency_ms:.0f} ms")
+        try:
+            yield conn
+        except BaseException as e:
+            if not await cm.__aexit__(type(e), e, e.__traceback__):
+                raise
+        else:
+            await cm.__aexit__(None, None, None)
+
+    async def probe_all(self):
+        async def probe(backend):
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(backend.probe(), self.probe_timeout)
+            except Exception as e:
+                logger.warning(f"Realtime backend {backend.name} failed probe: {e!r}")
+                self.record(backend, error=e)
+            else:
+                self.record(backend, (time.perf_counter() - started) * 1000)
+        await asyncio.gather(*(probe(b) for b in self.backends))
+
+    async def _probe_loop(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.probe_interval)
+
+    def start(self):
+        # With a single backend there is nothing to choose between, so skip the probes
+        if self._task is None and self.probe_interval > 0 and len(self.backends) > 1:
+            self._task = asyncio.create_task(self._probe_loop(), name='realtime-endpoint-probe')
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for backend in self.backends:
+            await backend.close()
+
+    def snapshot(self):
+        return {
+            'selected': self.pick().name,
+            'backends': {name: dict(state) for name, state in self._state.items()},
+        }
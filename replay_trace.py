@@ -0,0 +1,293 @@
+"""Replay a recorded bridge trace through the real handle_media_stream.
+
+The recorded Twilio frames are fed into ``handle_media_stream`` and the
+recorded upstream frames stand in for the realtime API.  The frames the bridge
+sends back out (to Twilio and upstream) are then diffed against the original
+trace, both in content and in timing, so bridge changes can be benchmarked on
+real traffic offline.
+
+    python replay_trace.py traces/trace-....avtrace            # recorded timing
+    python replay_trace.py traces/trace-....avtrace --fast     # as fast as possible
+
+``--self-check`` records a synthetic call against the echo loopback backend
+and checks that replaying the unmodified trace, in both modes, reproduces it.
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+
+from call_trace import (
+    DIR_IN, DIR_OUT, LEG_TWILIO, LEG_UPSTREAM, LEG_NAMES, TRACE_SUFFIX, TraceRecord, read_trace
+)
+from realtime_backends import EndpointSelector, LoopbackBackend, RealtimeBackend, RealtimeConnection
+
+
+class ReplayClock:
+    """Shared time base so replayed frames line up with the recorded offsets."""
+
+    def __init__(self, realtime):
+        self.realtime = realtime
+        self._t0 = time.monotonic_ns()
+        self._waiting = {}  # feeder -> recorded time of its next frame
+
+    def now_ns(self):
+        return time.monotonic_ns() - self._t0
+
+    async def wait_until(self, t_ns, feeder):
+        # Frames from both legs are released in their recorded order, at the
+        # recorded offsets or as fast as possible
+        self._waiting[feeder] = t_ns
+        delay = (t_ns - self.now_ns()) / 1e9 if self.realtime else 0
+        await asyncio.sleep(max(delay, 0))
+        while feeder in self._waiting and t_ns > min(self._waiting.values()):
+            await asyncio.sleep(0)
+
+    def done(self, feeder):
+        self._waiting.pop(feeder, None)
+
+
+class ReplayTwilioSocket:
+    """Starlette WebSocket stand-in fed from the recorded Twilio frames."""
+
+    def __init__(self, records, clock, end_ns=None):
+        self._records = records
+        self._clock = clock
+        self._end_ns = end_ns
+        self.sent = []
+        self.client_state = WebSocketState.CONNECTING
+        self.application_state = WebSocketState.CONNECTING
+        self.query_params = {}
+
+    async def accept(self, *args, **kwargs):
+        self.client_state = WebSocketState.CONNECTED
+        self.application_state = WebSocketState.CONNECTED
+
+    async def iter_text(self):
+        try:
+            for record in self._records:
+                await self._clock.wait_until(record.t_ns, 'twilio')
+                yield record.payload
+            if self._end_ns is not None:
+                # The caller hung up after the last recorded frame; upstream
+                # frames recorded up to then must still reach the bridge
+                await self._clock.wait_until(self._end_ns, 'twilio')
+        finally:
+            self._clock.done('twilio')
+        self.client_state = WebSocketState.DISCONNECTED
+
+    async def receive_text(self):
+        async for message in self.iter_text():
+            return message
+        raise WebSocketDisconnect(code=1000)
+
+    async def send_text(self, data):
+        self.sent.append((self._clock.now_ns(), data))
+
+    async def send_json(self, data, mode='text'):
+        await self.send_text(json.dumps(data, separators=(',', ':'), ensure_ascii=False))
+
+    async def close(self, code=1000, reason=None):
+        self.client_state = WebSocketState.DISCONNECTED
+        self.application_state = WebSocketState.DISCONNECTED
+
+
+class ReplayConnection(RealtimeConnection):
+    """Realtime connection that plays back the recorded upstream frames."""
+
+    def __init__(self, records, clock):
+        self._records = records
+        self._clock = clock
+        self.sent = []
+        self.closed = False
+        self._closed = asyncio.Event()
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        try:
+            for record in self._records:
+                await self._clock.wait_until(record.t_ns, 'upstream')
+                if self.closed:
+                    return
+                self._record(DIR_IN, record.payload)
+                yield json.loads(record.payload)
+            # Out of recorded frames: stay open like the real socket until
+            # the bridge closes it, or the Twilio leg would be cut short
+            self._clock.done('upstream')
+            await self._closed.wait()
+        finally:
+            self._clock.done('upstream')
+
+    async def send_json(self, event):
+        # Same serialization as OpenAIConnection, so frames diff byte for byte
+        raw = json.dumps(event)
+        self._record(DIR_OUT, raw)
+        self.sent.append((self._clock.now_ns(), raw))
+
+    async def close(self):
+        self.closed = True
+        self._closed.set()
+        self._clock.done('upstream')
+
+
+class ReplayBackend(RealtimeBackend):
+    name = 'replay'
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @asynccontextmanager
+    async def connect(self, model=None):
+        yield self.connection
+
+
+def _frames(records, leg, direction):
+    return [(r.t_ns, r.payload) for r in records if r.leg == leg and r.direction == direction]
+
+
+def _fingerprint(payload):
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def diff_frames(original, replayed):
+    """Compare two ``[(t_ns, payload)]`` sequences by content and relative timing."""
+    first_mismatch = None
+    for index, (a, b) in enumerate(zip(original, replayed)):
+        if _fingerprint(a[1]) != _fingerprint(b[1]):
+            first_mismatch = index
+            break
+    if first_mismatch is None and len(original) != len(replayed):
+        first_mismatch = min(len(original), len(replayed))
+
+    # Timing is compared relative to each run's first frame on this leg
+    deltas_ms = []
+    if original and replayed:
+        base_a, base_b = original[0][0], replayed[0][0]
+        for a, b in zip(original, replayed):
+            deltas_ms.append(((b[0] - base_b) - (a[0] - base_a)) / 1e6)
+
+    return {
+        'original_frames': len(original),
+        'replayed_frames': len(replayed),
+        'identical': first_mismatch is None,
+        'first_mismatch': first_mismatch,
+        'timing_delta_ms': {
+            'p50': _percentile(deltas_ms, 50),
+            'p95': _percentile(deltas_ms, 95),
+            'max_abs': round(max(abs(d) for d in deltas_ms), 3) if deltas_ms else None,
+        },
+    }
+
+
+async def replay(path, realtime=True):
+    """Replay the trace at ``path`` and return a diff report."""
+    import main
+
+    metadata, records = read_trace(path)
+    clock = ReplayClock(realtime)
+    twilio = ReplayTwilioSocket([r for r in records if r.leg == LEG_TWILIO and r.direction == DIR_IN], clock,
+                                end_ns=max((r.t_ns for r in records), default=None))
+    upstream = ReplayConnection([r for r in records if r.leg == LEG_UPSTREAM and r.direction == DIR_IN], clock)
+
+    saved = main.realtime_selector, main.TRACE_DIR
+    main.realtime_selector, main.TRACE_DIR = EndpointSelector([ReplayBackend(upstream)]), ''
+    started = time.perf_counter()
+    try:
+        await main.handle_media_stream(twilio)
+    finally:
+        main.realtime_selector, main.TRACE_DIR = saved
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'trace': path,
+        'recorded': metadata.get('created'),
+        'mode': 'realtime' if realtime else 'fast',
+        'wall_time_s': round(elapsed, 4),
+    }
+    for leg, replayed in ((LEG_TWILIO, twilio.sent), (LEG_UPSTREAM, upstream.sent)):
+        report[f"{LEG_NAMES[leg]}_out"] = diff_frames(_frames(records, leg, DIR_OUT), replayed)
+    return report
+
+
+def synthetic_call(frames=100):
+    """Twilio frames for a short call: connected, start, ``frames`` 20 ms media frames, stop."""
+    payload = base64.b64encode(bytes([0xff] * 160)).decode('ascii')
+    events = [{"event": "connected"},
+              {"event": "start", "start": {"streamSid": "MZselfcheck", "callSid": "CAselfcheck",
+                                           "customParameters": {}}}]
+    for i in range(frames):
+        events.append({"event": "media", "sequenceNumber": str(i + 2),
+                       "media": {"track": "inbound", "chunk": str(i + 1), "timestamp": str(i * 20),
+                                 "payload": payload}})
+    events.append({"event": "stop"})
+    offsets = [0, 1_000_000] + [2_000_000 + i * 20_000_000 for i in range(frames + 1)]
+    return [TraceRecord(t_ns, LEG_TWILIO, DIR_IN, json.dumps(event)) for t_ns, event in zip(offsets, events)]
+
+
+async def record_loopback_call(trace_dir, frames=100):
+    """Run a synthetic call through the bridge against the echo loopback backend; returns the trace path."""
+    import main
+
+    twilio = ReplayTwilioSocket(synthetic_call(frames), ReplayClock(True))
+    saved = main.realtime_selector, main.TRACE_DIR
+    main.realtime_selector, main.TRACE_DIR = EndpointSelector([LoopbackBackend('echo')]), trace_dir
+    try:
+        await main.handle_media_stream(twilio)
+    finally:
+        main.realtime_selector, main.TRACE_DIR = saved
+    return max(glob.glob(os.path.join(trace_dir, f"*{TRACE_SUFFIX}")), key=os.path.getmtime)
+
+
+async def self_check(frames=100):
+    """Record a loopback call and replay it in both modes; returns the reports."""
+    with tempfile.TemporaryDirectory() as trace_dir:
+        path = await record_loopback_call(trace_dir, frames)
+        return [await replay(path, realtime=realtime) for realtime in (True, False)]
+
+
+def _identical(report):
+    return report['twilio_out']['identical'] and report['upstream_out']['identical']
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a /media-stream trace and diff the output")
+    parser.add_argument('trace', nargs='?', help="Path to a .avtrace file")
+    parser.add_argument('--fast', action='store_true', help="Ignore recorded timing and replay as fast as possible")
+    parser.add_argument('--self-check', action='store_true',
+                        help="Record a synthetic loopback call and check that its replay is identical")
+    parser.add_argument('--frames', type=int, default=100, help="Media frames in the --self-check call")
+    args = parser.parse_args(argv)
+
+    if args.self_check:
+        reports = asyncio.run(self_check(args.frames))
+        print(json.dumps(reports, indent=2))
+        return 0 if all(_identical(report) for report in reports) else 1
+    if not args.trace:
+        parser.error("a trace path is required unless --self-check is given")
+
+    report = asyncio.run(replay(args.trace, realtime=not args.fast))
+    print(json.dumps(report, indent=2))
+    return 0 if _identical(report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,116 @@
+"""Per-session resource accounting and guaranteed cleanup for media bridges.
+
+Every ``/media-stream`` connection runs inside ``SessionRegistry.track``.  The
+session owns the tasks it spawns; when either direction of the bridge ends,
+``run_until_first_done`` cancels the sibling, and leaving ``track`` cancels
+anything still alive, so no task outlives its call.  The registry keeps
+byte/frame counts and the peak buffered bytes per live session
+(``/admin/sessions``) plus process-wide gauges that a soak test can check
+for growth after sessions end.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Session:
+    def __init__(self, stream_sid, call_sid=None, profile=None):
+        self.stream_sid = stream_sid
+        self.call_sid = call_sid
+        self.profile = profile
+        self.started = time.monotonic()
+        self.tasks = set()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.buffered_bytes = 0
+        self.peak_buffered_bytes = 0
+        self.jitter = None  # the call's JitterBuffer, when enabled
+
+    def spawn(self, coro, name):
+        """Start a task owned by this session."""
+        task = asyncio.create_task(coro, name=f"{name}[{self.stream_sid}]")
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def note_buffered(self, nbytes):
+        """Record how many bytes the bridge currently holds for this call."""
+        self.buffered_bytes = nbytes
+        if nbytes > self.peak_buffered_bytes:
+            self.peak_buffered_bytes = nbytes
+
+    async def run_until_first_done(self, *coros_and_names):
+        """Run ``(coro, name)`` pairs; when the first finishes, cancel the rest."""
+        tasks = [self.spawn(coro, name) for coro, name in coros_and_names]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(f"Bridge task {task.get_name()} failed: {task.exception()!r}")
+        finally:
+            await self.cancel_tasks()
+
+    async def cancel_tasks(self):
+        pending = [task for task in self.tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def snapshot(self):
+        return {
+            'stream_sid': self.stream_sid,
+            'call_sid': self.call_sid,
+            'profile': self.profile,
+            'age_s': round(time.monotonic() - self.started, 1),
+            'tasks': len(self.tasks),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'buffered_bytes': self.buffered_bytes,
+            'peak_buffered_bytes': self.peak_buffered_bytes,
+            'jitter': self.jitter.stats() if self.jitter else None,
+        }
+
+
+class SessionRegistry:
+    def __init__(self):
+        self.active = {}
+        self.opened = 0
+        self.closed = 0
+
+    @asynccontextmanager
+    async def track(self, stream_sid, call_sid=None, profile=None):
+        session = Session(stream_sid, call_sid, profile)
+        key = id(session)  # stream SIDs are unique in production, not in replays and soak runs
+        self.active[key] = session
+        self.opened += 1
+        metrics.inc('bridge.sessions_opened')
+        metrics.set_gauge('bridge.sessions_active', len(self.active))
+        try:
+            yield session
+        finally:
+            await session.cancel_tasks()
+            del self.active[key]
+            self.closed += 1
+            metrics.inc('bridge.sessions_closed')
+            metrics.set_gauge('bridge.sessions_active', len(self.active))
+            metrics.histogram('bridge.session_peak_buffered_bytes', BYTE_BUCKETS).observe(session.peak_buffered_bytes)
+
+    def live_tasks(self):
+        return sum(len(s.tasks) for s in self.active.values())
+
+    def snapshot(self):
+        return {
+            'active': len(self.active),
+            'opened': self.opened,
+            'closed': self.closed,
+            'live_tasks': self.live_tasks(),
+            'sessions': [s.snapshot() for s in self.active.values()],
+        }
@@ -0,0 +1,212 @@
+"""Soak test: run many synthetic calls through the bridge and check nothing leaks.
+
+Sessions run through ``main.handle_media_stream`` with a synthetic Twilio leg
+(the replay socket, fed generated frames) and a local upstream stand-in:
+
+* ``--backend loopback`` - the in-process loopback backend;
+* ``--backend ws`` - a local aiohttp WebSocket server speaking the realtime
+  protocol, reached through ``OpenAIRealtimeBackend``, so client sessions,
+  connectors and sockets are exercised too.
+
+After a warm-up, resident memory, open sockets, file descriptors and live
+tasks are sampled, then thousands of sequential and concurrent sessions are
+run and the samples taken again once they have ended.  Exit status is 1 when
+anything grew beyond the allowed slack.
+
+    python soak.py --sessions 2000 --concurrency 50 --backend ws
+"""
+import argparse
+import asyncio
+import base64
+import gc
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger('soak')
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        # Peak rather than current RSS (kB on Linux, bytes on macOS); still catches creep
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def open_fds():
+    fd_dir = '/proc/self/fd' if os.path.isdir('/proc/self/fd') else '/dev/fd'
+    fds, sockets = 0, 0
+    for name in os.listdir(fd_dir):
+        fds += 1
+        try:
+            sockets += os.readlink(os.path.join(fd_dir, name)).startswith('socket:')
+        except OSError:
+            pass
+    return fds, sockets
+
+
+async def sample(main):
+    # Let cancelled tasks and closing transports finish before counting
+    for _ in range(5):
+        await asyncio.sleep(0.05)
+    gc.collect()
+    fds, sockets = open_fds()
+    return {
+        'rss_mb': round(rss_mb(), 1),
+        'fds': fds,
+        'sockets': sockets,
+        'tasks': len(asyncio.all_tasks()) - 1,
+        'sessions_active': len(main.session_registry.active),
+        'db_backlog': main.db_writer.backlog,
+    }
+
+
+def synthetic_call(index, frames, frame_ms):
+    """Twilio frames for one call: connected, start, media, stop."""
+    from call_trace import TraceRecord, LEG_TWILIO, DIR_IN
+    sid = f"MZsoak{index:08d}"
+    payload = base64.b64encode(bytes([0xff]) * 160).decode('ascii')
+    step = int(frame_ms * 1e6)
+    messages = [
+        {"event": "connected"},
+        {"event": "start", "start": {"streamSid": sid, "callSid": f"CAsoak{index:08d}", "customParameters": {}}},
+    ]
+    messages += [
+        {"event": "media", "sequenceNumber": str(i + 2),
+         "media": {"track": "inbound", "chunk": str(i + 1), "timestamp": str(i * 20), "payload": payload}}
+        for i in range(frames)
+    ]
+    messages.append({"event": "stop"})
+    return [TraceRecord(i * step, LEG_TWILIO, DIR_IN, json.dumps(m)) for i, m in enumerate(messages)]
+
+
+async def start_ws_standin(mode):
+    """Serve the loopback protocol over a real local WebSocket."""
+    from aiohttp import web, WSMsgType
+    from realtime_backends import LoopbackConnection
+
+    async def realtime(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        conn = LoopbackConnection(mode)
+
+        async def pump():
+            async for event in conn:
+                await ws.send_json(event)
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    await conn.send_json(json.loads(msg.data))
+        finally:
+            await conn.close()
+            pump_task.cancel()
+            await asyncio.gather(pump_task, return_exceptions=True)
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/v1/realtime', realtime)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"ws://127.0.0.1:{port}/v1/realtime"
+
+
+async def run_session(main, replay_trace, index, args):
+    clock = replay_trace.ReplayClock(realtime=True)
+    socket = replay_trace.ReplayTwilioSocket(synthetic_call(index, args.frames, args.frame_ms), clock)
+    await main.handle_media_stream(socket)
+    return len(socket.sent)
+
+
+async def soak(args):
+    import main
+    import replay_trace
+    from realtime_backends import EndpointSelector, LoopbackBackend, OpenAIRealtimeBackend
+
+    runner = None
+    if args.backend == 'ws':
+        runner, url = await start_ws_standin(args.mode)
+        backend = OpenAIRealtimeBackend(url, 'soak', 'soak')
+    else:
+        backend = LoopbackBackend(args.mode)
+    main.realtime_selector = EndpointSelector([backend])
+    main.TRACE_DIR = ''
+    await asyncio.to_thread(main.db_writer.start)
+
+    counter = 0
+
+    async def batch(count, concurrency):
+        nonlocal counter
+        started = time.perf_counter()
+        for offset in range(0, count, concurrency):
+            size = min(concurrency, count - offset)
+            await asyncio.gather(*(run_session(main, replay_trace, counter + i, args) for i in range(size)))
+            counter += size
+        return time.perf_counter() - started
+
+    try:
+        await batch(args.warmup, args.concurrency)
+        baseline = await sample(main)
+        print(f"baseline:   {baseline}")
+
+        elapsed = await batch(args.sessions, 1)
+        sequential = await sample(main)
+        print(f"sequential: {sequential} ({args.sessions} sessions in {elapsed:.1f}s)")
+
+        elapsed = await batch(args.sessions, args.concurrency)
+        concurrent = await sample(main)
+        print(f"concurrent: {concurrent} ({args.sessions} sessions x{args.concurrency} in {elapsed:.1f}s)")
+    finally:
+        await main.realtime_selector.stop()
+        if runner:
+            await runner.cleanup()
+        await asyncio.to_thread(main.db_writer.stop)
+
+    failures = []
+    for name, after in (('sequential', sequential), ('concurrent', concurrent)):
+        if after['rss_mb'] - baseline['rss_mb'] > args.max_rss_growth_mb:
+            failures.append(f"{name}: RSS grew {after['rss_mb'] - baseline['rss_mb']:.1f} MB")
+        for key in ('fds', 'sockets', 'tasks'):
+            if after[key] - baseline[key] > args.slack:
+                failures.append(f"{name}: {key} grew from {baseline[key]} to {after[key]}")
+        if after['sessions_active']:
+            failures.append(f"{name}: {after['sessions_active']} sessions still registered")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("OK: no growth after sessions ended")
+    return 1 if failures else 0
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Soak the media bridge with synthetic calls")
+    parser.add_argument('--sessions', type=int, default=2000, help="Sessions per phase")
+    parser.add_argument('--concurrency', type=int, default=50, help="Concurrent sessions in the concurrent phase")
+    parser.add_argument('--warmup', type=int, default=200, help="Sessions before the baseline sample")
+    parser.add_argument('--frames', type=int, default=50, help="Media frames per call")
+    parser.add_argument('--frame-ms', type=float, default=0.5, help="Frame spacing (20 for real time)")
+    parser.add_argument('--backend', choices=('loopback', 'ws'), default='loopback')
+    parser.add_argument('--mode', choices=('tone', 'echo'), default='echo', help="Loopback behaviour")
+    parser.add_argument('--max-rss-growth-mb', type=float, default=16.0)
+    parser.add_argument('--slack', type=int, default=2, help="Allowed growth in fds, sockets and tasks")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault('CALL_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='soak-'), 'soak.db'))
+    os.environ['TRACE_DIR'] = ''
+    return asyncio.run(soak(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,154 @@
+"""Precompressed, fingerprinted static assets and cached dashboard pages.
+
+``StaticAssets.build`` reads every file under ``static/`` once, names it by
+content hash (``css/style.3f2a9c1d.css``) and precompresses text assets with
+gzip and, when the optional ``brotli`` package is installed, brotli.  Requests
+are then answered from memory: the encoding is negotiated from
+``Accept-Encoding``, ``If-None-Match`` / ``If-Modified-Since`` get a 304, and
+fingerprinted URLs are cached by browsers for a year as immutable.  The
+original unhashed paths keep working but must revalidate.
+
+``Asset`` is also used for pages rendered once per configuration, so the
+dashboard costs the media bridges sharing this event loop almost nothing.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 256
+
+
+class Asset:
+    """One resource held in memory in every encoding worth serving."""
+
+    def __init__(self, body, content_type, mtime=None):
+        digest = hashlib.sha256(body).hexdigest()
+        self.hash = digest[:8]
+        self.content_type = content_type
+        self.last_modified = formatdate(mtime, usegmt=True) if mtime else None
+        self._mtime = int(mtime) if mtime else None
+        # encoding -> (body, etag); identity always present
+        self.variants = {'identity': (body, f'"{digest[:16]}"')}
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            candidates = [('gzip', gzip.compress(body, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                candidates.append(('br', brotli.compress(body, quality=11)))
+            for encoding, compressed in candidates:
+                if len(compressed) < len(body):
+                    self.variants[encoding] = (compressed, f'"{digest[:16]}-{encoding}"')
+
+    def negotiate(self, accept_encoding):
+        """Pick the smallest variant the client accepts."""
+        accepted = _parse_accept_encoding(accept_encoding)
+        best = 'identity'
+        for encoding, (body, _) in self.variants.items():
+            if encoding != 'identity' and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                if len(body) < len(self.variants[best][0]):
+                    best = encoding
+        return best
+
+    def not_modified(self, request, etag):
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return '*' in tags or etag in tags
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since and self._mtime is not None:
+            try:
+                return self._mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def response(self, request, cache_control=REVALIDATE):
+        encoding = self.negotiate(request.headers.get('accept-encoding', ''))
+        body, etag = self.variants[encoding]
+        headers = {'ETag': etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+        if self.last_modified:
+            headers['Last-Modified'] = self.last_modified
+        if self.not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        if request.method == 'HEAD':
+            headers['Content-Length'] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=self.content_type)
+        return Response(content=body, headers=headers, media_type=self.content_type)
+
+
+def _parse_accept_encoding(header):
+    accepted = {'identity': 1.0}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def _fingerprinted(path, digest):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+
+class StaticAssets:
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest = {}   # logical path -> fingerprinted path
+        self._assets = {}    # request path -> (asset, cache_control)
+        self.version = None
+
+    def build(self):
+        """Load, fingerprint and precompress everything under ``directory``."""
+        manifest, assets = {}, {}
+        for root, _, files in os.walk(self.directory):
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                logical = os.path.relpath(full, self.directory).replace(os.sep, '/')
+                with open(full, 'rb') as f:
+                    body = f.read()
+                content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                if content_type.startswith('text/') or content_type == 'application/javascript':
+                    content_type += '; charset=utf-8'
+                asset = Asset(body, content_type, os.path.getmtime(full))
+                hashed = _fingerprinted(logical, asset.hash)
+                manifest[logical] = hashed
+                assets[logical] = (asset, REVALIDATE)
+                assets[hashed] = (asset, IMMUTABLE)
+        self.manifest, self._assets = manifest, assets
+        self.version = hashlib.sha256(repr(sorted(manifest.items())).encode()).hexdigest()[:8]
+        encodings = sorted({e for asset, _ in assets.values() for e in asset.variants})
+        logger.info(f"Built {len(manifest)} static assets (encodings: {', '.join(encodings)})")
+
+    def url(self, path):
+        """Return the cache-busting URL for a logical static path."""
+        return f"/static/{self.manifest.get(path, path)}"
+
+    def response(self, request, path):
+        entry = self._assets.get(path)
+        if entry is None:
+            return Response(status_code=404)
+        asset, cache_control = entry
+        return asset.response(request, cache_control)
@@ -0,0 +1,129 @@
+"""Embedded SQLite storage with a batched background writer.
+
+The bridge must never wait on disk, so rows are handed to
+``BatchedSQLiteWriter.submit`` (a non-blocking queue put) and a single writer
+thread commits them in batches: it blocks for the first row, then keeps
+collecting until ``max_batch`` rows or ``flush_interval`` seconds have passed,
+and writes the whole batch in one transaction.  If the queue is full the row
+is dropped and counted rather than stalling the caller.
+
+Reads open their own WAL-mode connections, so queries run concurrently with
+the writer; call ``query`` from a worker thread (``asyncio.to_thread``).
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from itertools import groupby
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class BatchedSQLiteWriter:
+    def __init__(self, path, max_batch=500, flush_interval=0.5, max_queue=50000):
+        self.path = path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._schema = []
+        self._thread = None
+        self._local = threading.local()
+
+    def add_schema(self, statements):
+        """Register DDL to run before the first write; safe to call repeatedly."""
+        self._schema.extend(statements)
+        if self._thread is not None:
+            self._apply_schema(statements)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._apply_schema(self._schema)
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+        logger.info(f"SQLite writer started for {self.path}")
+
+    def stop(self, timeout=10):
+        """Flush queued rows and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, sql, params=()):
+        """Queue one statement; returns False if it had to be dropped."""
+        try:
+            self._queue.put_nowait((sql, params))
+            return True
+        except queue.Full:
+            metrics.inc('storage.dropped_rows')
+            return False
+
+    @property
+    def backlog(self):
+        return self._queue.qsize()
+
+    def query(self, sql, params=()):
+        """Run a read query on this thread's connection and return the rows."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn.execute(sql, params).fetchall()
+
+    def _apply_schema(self, statements):
+        conn = connect(self.path)
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _run(self):
+        conn = connect(self.path)
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(conn, batch)
+        conn.close()
+
+    def _write(self, conn, batch):
+        started = time.perf_counter()
+        try:
+            with conn:
+                # Consecutive rows for the same statement go through one executemany
+                for sql, rows in groupby(batch, key=lambda item: item[0]):
+                    conn.executemany(sql, [params for _, params in rows])
+            metrics.inc('storage.rows_written', len(batch))
+        except sqlite3.Error as e:
+            metrics.inc('storage.failed_rows', len(batch))
+            logger.error(f"SQLite batch of {len(batch)} rows failed: {e}")
+        metrics.observe('storage.batch_ms', (time.perf_counter() - started) * 1000)
@@ -0,0 +1,180 @@
+"""Incremental call transcripts.
+
+``TranscriptAssembler`` stitches the upstream transcription events of one call
+into turns keyed by conversation item ID:
+
+* caller turns take their span from ``input_audio_buffer.speech_started`` /
+  ``speech_stopped`` (``audio_start_ms`` / ``audio_end_ms``) and their text
+  from ``conversation.item.input_audio_transcription.completed``;
+* assistant turns accumulate ``response.audio_transcript.delta`` text, start at
+  the Twilio media timestamp current when their first audio arrives, and last
+  as long as the audio sent for that item.
+
+All times are milliseconds on the Twilio stream's media timeline.  Finished
+turns go straight to the sink (normally ``TranscriptStore.add``) and are
+forgotten, and open turns are capped in number and length, so memory per call
+stays bounded however long the call runs.
+"""
+import logging
+import time
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_EVENT_TYPES = frozenset([
+    'input_audio_buffer.speech_started',
+    'input_audio_buffer.speech_stopped',
+    'conversation.item.input_audio_transcription.completed',
+    'conversation.item.input_audio_transcription.failed',
+    'response.audio_transcript.delta',
+    'response.audio_transcript.done',
+])
+
+TRANSCRIPT_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS transcript_turns (
+        id INTEGER PRIMARY KEY,
+        call_sid TEXT NOT NULL,
+        stream_sid TEXT,
+        item_id TEXT,
+        role TEXT NOT NULL,
+        start_ms INTEGER,
+        end_ms INTEGER,
+        text TEXT NOT NULL,
+        complete INTEGER NOT NULL,
+        created_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_transcript_turns_call ON transcript_turns (call_sid, start_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_transcript_turns_created ON transcript_turns (created_at)",  # for prune
+)
+
+TranscriptTurn = namedtuple('TranscriptTurn', 'call_sid stream_sid item_id role start_ms end_ms text complete created_at')
+
+
+class _OpenTurn:
+    __slots__ = ('role', 'start_ms', 'end_ms', 'parts', 'chars', 'audio_bytes')
+
+    def __init__(self, role, start_ms=None):
+        self.role = role
+        self.start_ms = start_ms
+        self.end_ms = None
+        self.parts = []
+        self.chars = 0
+        self.audio_bytes = 0
+
+
+class TranscriptAssembler:
+    def __init__(self, call_sid, stream_sid, sink, max_open_turns=16, max_turn_chars=8000):
+        self.call_sid = call_sid
+        self.stream_sid = stream_sid
+        self._sink = sink
+        self.max_open_turns = max_open_turns
+        self.max_turn_chars = max_turn_chars
+        self._open = OrderedDict()
+        self.media_ms = 0  # latest inbound media timestamp
+        self.turns_written = 0
+
+    def note_media_timestamp(self, timestamp_ms):
+        self.media_ms = timestamp_ms
+
+    def note_output_audio(self, item_id, nbytes):
+        """Account ``nbytes`` of mu-law audio (8 bytes per ms) sent for ``item_id``."""
+        if not item_id:
+            return  # no item to attribute it to; a turn keyed on None would never finish
+        turn = self._turn(item_id, 'assistant')
+        if turn.start_ms is None:
+            turn.start_ms = self.media_ms
+        turn.audio_bytes += nbytes
+
+    def handle_event(self, event):
+        kind = event['type']
+        item_id = event.get('item_id')
+        if not item_id:
+            return
+        if kind == 'input_audio_buffer.speech_started':
+            self._turn(item_id, 'user').start_ms = event.get('audio_start_ms')
+        elif kind == 'input_audio_buffer.speech_stopped':
+            self._turn(item_id, 'user').end_ms = event.get('audio_end_ms')
+        elif kind == 'conversation.item.input_audio_transcription.completed':
+            turn = self._turn(item_id, 'user')
+            self._append(turn, event.get('transcript') or '')
+            self._finish(item_id, complete=True)
+        elif kind == 'conversation.item.input_audio_transcription.failed':
+            logger.warning(f"Transcription failed for {item_id}: {event.get('error')}")
+            self._finish(item_id, complete=False)
+        elif kind == 'response.audio_transcript.delta':
+            turn = self._turn(item_id, 'assistant')
+            if turn.start_ms is None:
+                turn.start_ms = self.media_ms
+            self._append(turn, event.get('delta') or '')
+        elif kind == 'response.audio_transcript.done':
+            turn = self._turn(item_id, 'assistant')
+            if event.get('transcript') is not None:
+                # The final transcript is authoritative over the stitched deltas
+                turn.parts, turn.chars = [], 0
+                self._append(turn, event['transcript'])
+            self._finish(item_id, complete=True)
+
+    def close(self):
+        """Write out whatever is still open when the call ends."""
+        for item_id in list(self._open):
+            self._finish(item_id, complete=False)
+
+    def _turn(self, item_id, role):
+        turn = self._open.get(item_id)
+        if turn is None:
+            if len(self._open) >= self.max_open_turns:
+                oldest = next(iter(self._open))
+                logger.warning(f"Too many open transcript turns; flushing {oldest} early")
+                self._finish(oldest, complete=False)
+            turn = self._open[item_id] = _OpenTurn(role)
+        return turn
+
+    def _append(self, turn, text):
+        room = self.max_turn_chars - turn.chars
+        if room > 0 and text:
+            text = text[:room]
+            turn.parts.append(text)
+            turn.chars += len(text)
+
+    def _finish(self, item_id, complete):
+        turn = self._open.pop(item_id, None)
+        if turn is None:
+            return
+        end_ms = turn.end_ms
+        if end_ms is None and turn.start_ms is not None and turn.audio_bytes:
+            end_ms = turn.start_ms + turn.audio_bytes // 8
+        text = ''.join(turn.parts)
+        if not text and not complete:
+            return
+        self._sink(TranscriptTurn(
+            self.call_sid, self.stream_sid, item_id, turn.role,
+            turn.start_ms, end_ms, text, complete, time.time()
+        ))
+        self.turns_written += 1
+
+
+class TranscriptStore:
+    """Append-only transcript table written through a ``BatchedSQLiteWriter``."""
+
+    _INSERT = (
+        "INSERT INTO transcript_turns "
+        "(call_sid, stream_sid, item_id, role, start_ms, end_ms, text, complete, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, writer):
+        self.writer = writer
+        writer.add_schema(TRANSCRIPT_SCHEMA)
+
+    def add(self, turn):
+        if not self.writer.submit(self._INSERT, tuple(turn)):
+            logger.warning(f"Transcript writer backlog full; dropped turn {turn.item_id}")
+
+    def fetch(self, call_sid):
+        """Return the turns of one call in timeline order (blocking)."""
+        rows = self.writer.query(
+            "SELECT item_id, role, start_ms, end_ms, text, complete, created_at "
+            "FROM transcript_turns WHERE call_sid = ? ORDER BY start_ms, id",
+            (call_sid,)
+        )
+        return [dict(row) for row in rows]
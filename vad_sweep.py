@@ -0,0 +1,284 @@
+"""Sweep turn-detection settings over recorded caller audio.
+
+Every clip in the corpus is replayed through ``main.handle_media_stream`` once
+per setting, against the loopback backend: in ``server_vad`` mode the loopback
+segments the audio with ``ServerVadSimulator`` using the ``turn_detection``
+block the bridge actually sent; in ``manual`` mode the bridge's own endpointer
+commits turns.  Either way the loopback records where each turn was ended on
+the input audio clock, which is compared with the clip's reference turns:
+
+* premature cutoff - a turn ended while the caller was still speaking;
+* missed turn      - a reference turn that never got an end of turn;
+* latency          - reference speech end to the end-of-turn decision.
+
+Corpus entries are ``.avtrace`` files (the caller leg is used), 16-bit PCM
+``.wav`` files or raw 8 kHz μ-law ``.ulaw`` files.  Reference turns come from
+a sibling ``<name>.json`` with ``{"turns": [[start_ms, end_ms], ...]}``; clips
+without one are labelled by a conservative offline endpointer instead.
+
+    python vad_sweep.py corpus/ --threshold 0.4,0.5,0.6 --silence-duration-ms 300,500,700 \\
+        --hangover-ms 300,500 --json sweep.json
+"""
+import argparse
+import asyncio
+import base64
+import contextvars
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import wave
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+logger = logging.getLogger('vad_sweep')
+
+FRAME_BYTES = 160  # 20 ms of 8 kHz μ-law
+
+_connections = contextvars.ContextVar('vad_sweep_connections')
+
+
+def load_audio(path):
+    """Return the caller audio of a corpus file as 8 kHz μ-law bytes."""
+    from audio_dsp import SAMPLE_RATE, encode_ulaw
+    from call_trace import DIR_IN, LEG_TWILIO, read_trace
+
+    if path.endswith('.avtrace'):
+        _, records = read_trace(path)
+        chunks = []
+        for record in records:
+            if record.leg == LEG_TWILIO and record.direction == DIR_IN:
+                message = json.loads(record.payload)
+                if message.get('event') == 'media':
+                    chunks.append(base64.b64decode(message['media']['payload']))
+        return b''.join(chunks)
+    if path.endswith('.wav'):
+        with wave.open(path, 'rb') as f:
+            if f.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+            rate, channels = f.getframerate(), f.getnchannels()
+            samples = np.frombuffer(f.readframes(f.getnframes()), dtype='<i2')[::channels] / 32768.0
+        if rate != SAMPLE_RATE:
+            positions = np.arange(0, len(samples), rate / SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(len(samples)), samples)
+        return encode_ulaw(samples)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def reference_turns(path, audio):
+    """Labelled turns for a clip, or a conservative endpointer's segmentation."""
+    from endpointing import Endpointer, SPEECH_STARTED, SPEECH_STOPPED
+
+    label_path = os.path.splitext(path)[0] + '.json'
+    if os.path.exists(label_path):
+        with open(label_path) as f:
+            return [tuple(turn) for turn in json.load(f)['turns']], True
+
+    endpointer = Endpointer(hangover_ms=1200, min_speech_ms=200)
+    turns, start = [], None
+    for index in range(0, len(audio) - FRAME_BYTES + 1, FRAME_BYTES):
+        event = endpointer.process(audio[index:index + FRAME_BYTES])
+        position_ms = (index + FRAME_BYTES) // 8
+        if event == SPEECH_STARTED:
+            start = position_ms - endpointer.min_speech_ms
+        elif event == SPEECH_STOPPED:
+            turns.append((start, position_ms - endpointer.trailing_silence_ms))
+    return turns, False
+
+
+def score_clip(turns, decisions, tolerance_ms):
+    """Compare end-of-turn decision times (audio ms) with reference turns."""
+    premature, false_alarms, latencies, matched = 0, 0, [], set()
+    for decided in decisions:
+        inside = [i for i, (start, end) in enumerate(turns) if start <= decided < end - tolerance_ms]
+        if inside:
+            premature += 1
+            continue
+        # The turn this decision closes: the last one ending before it, if the next has not begun
+        candidates = [i for i, (start, end) in enumerate(turns) if end - tolerance_ms <= decided
+                      and (i + 1 == len(turns) or decided < turns[i + 1][0])]
+        if candidates and candidates[-1] not in matched:
+            matched.add(candidates[-1])
+            latencies.append(decided - turns[candidates[-1]][1])
+        else:
+            false_alarms += 1
+    return {
+        'turns': len(turns),
+        'premature': premature,
+        'missed': len(turns) - len(matched),
+        'false_alarms': false_alarms,
+        'latencies_ms': latencies,
+    }
+
+
+def settings_grid(args):
+    grid = []
+    if args.mode in ('server_vad', 'both'):
+        for threshold, padding, silence in itertools.product(
+                args.threshold, args.prefix_padding_ms, args.silence_duration_ms):
+            grid.append({'mode': 'server_vad', 'threshold': threshold,
+                         'prefix_padding_ms': padding, 'silence_duration_ms': silence})
+    if args.mode in ('manual', 'both'):
+        for hangover, margin in itertools.product(args.hangover_ms, args.margin_db):
+            grid.append({'mode': 'manual', 'hangover_ms': hangover, 'margin_db': margin})
+    return grid
+
+
+def twilio_records(audio, index, profile, tail_ms):
+    from call_trace import DIR_IN, LEG_TWILIO, TraceRecord
+
+    audio = audio + b'\xff' * (tail_ms * 8)  # trailing silence so the last turn can end
+    sid = f"MZsweep{index:06d}"
+    messages = [
+        {"event": "connected"},
+        {"event": "start", "start": {"streamSid": sid, "callSid": f"CAsweep{index:06d}",
+                                     "customParameters": {"profile": profile}}},
+    ]
+    for n, offset in enumerate(range(0, len(audio) - FRAME_BYTES + 1, FRAME_BYTES)):
+        messages.append({"event": "media", "sequenceNumber": str(n + 2), "media": {
+            "track": "inbound", "chunk": str(n + 1), "timestamp": str(n * 20),
+            "payload": base64.b64encode(audio[offset:offset + FRAME_BYTES]).decode('ascii')}})
+    messages.append({"event": "stop"})
+    return [TraceRecord(i, LEG_TWILIO, DIR_IN, json.dumps(m)) for i, m in enumerate(messages)]
+
+
+def capturing_backend():
+    """A silent loopback backend that hands each job the connection it opened."""
+    from realtime_backends import LoopbackBackend
+
+    class CapturingBackend(LoopbackBackend):
+        @asynccontextmanager
+        async def connect(self, model=None):
+            async with super().connect(model) as conn:
+                _connections.get().append(conn)
+                yield conn
+
+    return CapturingBackend('silent')
+
+
+async def run_clip(main, replay_trace, records):
+    """Bridge one clip as fast as possible; return the loopback's turn-end decisions."""
+    connections = []
+    _connections.set(connections)  # each job runs in its own task, so its own context
+    clock = replay_trace.ReplayClock(realtime=False)
+    await main.handle_media_stream(replay_trace.ReplayTwilioSocket(records, clock))
+    return [decided for _, decided in connections[0].turn_ends] if connections else []
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 1)
+
+
+async def sweep(args):
+    import main
+    import replay_trace
+    from realtime_backends import EndpointSelector
+
+    corpus = []
+    for entry in args.corpus:
+        paths = [os.path.join(entry, n) for n in sorted(os.listdir(entry))] if os.path.isdir(entry) else [entry]
+        for path in paths:
+            if path.endswith(('.avtrace', '.wav', '.ulaw')):
+                audio = load_audio(path)
+                turns, labelled = reference_turns(path, audio)
+                if not labelled:
+                    logger.warning(f"{path}: no labels, using the reference endpointer")
+                corpus.append((path, audio, turns))
+    if not corpus:
+        print("No corpus files found (.avtrace, .wav, .ulaw)")
+        return 1
+
+    grid = settings_grid(args)
+    for index, setting in enumerate(grid):
+        main.PROFILES[f'vad-sweep-{index}'] = {
+            'turn_detection': setting,
+            'transcription': {'enabled': False},
+            'admission': {'max_loop_lag_ms': 0, 'min_headroom': 0},
+        }
+    main.realtime_selector = EndpointSelector([capturing_backend()])
+    main.TRACE_DIR = ''
+    await asyncio.to_thread(main.db_writer.start)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = {index: [] for index in range(len(grid))}
+
+    async def job(job_index, setting_index, clip):
+        path, audio, turns = clip
+        async with semaphore:
+            records = twilio_records(audio, job_index, f'vad-sweep-{setting_index}', args.tail_ms)
+            decisions = await run_clip(main, replay_trace, records)
+        results[setting_index].append(score_clip(turns, decisions, args.tolerance_ms))
+
+    try:
+        jobs = itertools.product(range(len(grid)), corpus)
+        await asyncio.gather(*(job(i, s, clip) for i, (s, clip) in enumerate(jobs)))
+    finally:
+        await asyncio.to_thread(main.db_writer.stop)
+
+    report = []
+    for index, setting in enumerate(grid):
+        clips = results[index]
+        latencies = [v for clip in clips for v in clip['latencies_ms']]
+        turns = sum(c['turns'] for c in clips) or 1
+        report.append({
+            'setting': setting,
+            'turns': sum(c['turns'] for c in clips),
+            'premature_rate': round(sum(c['premature'] for c in clips) / turns, 3),
+            'missed_rate': round(sum(c['missed'] for c in clips) / turns, 3),
+            'false_alarms': sum(c['false_alarms'] for c in clips),
+            'latency_p50_ms': _percentile(latencies, 50),
+            'latency_p95_ms': _percentile(latencies, 95),
+        })
+    report.sort(key=lambda r: (r['missed_rate'] + r['premature_rate'], r['latency_p50_ms'] or float('inf')))
+
+    labels = [' '.join(f"{k}={v}" for k, v in row['setting'].items()) for row in report]
+    width = max(len(label) for label in labels)
+    print(f"{len(corpus)} clips x {len(grid)} settings")
+    print(f"{'setting':<{width}} {'premature':>9} {'missed':>7} {'false':>6} {'p50 ms':>7} {'p95 ms':>7}")
+    for setting, row in zip(labels, report):
+        print(f"{setting:<{width}} {row['premature_rate']:>9.3f} {row['missed_rate']:>7.3f} "
+              f"{row['false_alarms']:>6} {row['latency_p50_ms'] or '-':>7} {row['latency_p95_ms'] or '-':>7}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def _floats(text):
+    return [float(v) for v in text.split(',') if v]
+
+
+def _ints(text):
+    return [int(v) for v in text.split(',') if v]
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep turn-detection settings over recorded caller audio")
+    parser.add_argument('corpus', nargs='+', help="Corpus files or directories")
+    parser.add_argument('--mode', choices=('server_vad', 'manual', 'both'), default='both')
+    parser.add_argument('--threshold', type=_floats, default=[0.3, 0.5, 0.7])
+    parser.add_argument('--prefix-padding-ms', type=_ints, default=[300])
+    parser.add_argument('--silence-duration-ms', type=_ints, default=[200, 400, 600, 800])
+    parser.add_argument('--hangover-ms', type=_ints, default=[300, 500, 700])
+    parser.add_argument('--margin-db', type=_floats, default=[9.0])
+    parser.add_argument('--tolerance-ms', type=int, default=100, help="Slack around reference turn ends")
+    parser.add_argument('--tail-ms', type=int, default=2000, help="Silence appended to each clip")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--json', help="Write the full report here")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault('CALL_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='vad-sweep-'), 'sweep.db'))
+    os.environ['TRACE_DIR'] = ''
+    return asyncio.run(sweep(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,121 @@
+"""Open and bootstrap upstream sessions before Twilio's media stream arrives.
+
+For inbound calls the ``/incoming-call`` webhook fires a second or more before
+the ``/media-stream`` ``start`` event.  ``WarmSessions.prepare`` uses that gap
+to connect to the realtime backend and send the profile's bootstrap events,
+keyed by CallSid, so the greeting may already be generating when the stream
+starts.  ``WarmSessions.connect`` hands the bridge the warm connection when
+there is one and falls back to a cold connect otherwise (outbound calls,
+warm-up failures, or a stream that arrived before the handshake finished is
+simply awaited).  Sessions nobody claims within ``ttl`` seconds are closed.
+"""
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WarmSession:
+    """An upstream session as handed to the bridge."""
+
+    def __init__(self, connection, warmed=False, answered_at=None):
+        self.connection = connection
+        self.warmed = warmed          # bootstrap already sent
+        self.answered_at = answered_at  # monotonic time the webhook fired
+
+
+class _Pending:
+    def __init__(self, answered_at):
+        self.answered_at = answered_at
+        self.stack = AsyncExitStack()
+        self.connection = None
+        self.task = None
+        self.expiry = None
+
+
+class WarmSessions:
+    def __init__(self, get_selector, bootstrap, ttl=30.0, enabled=True):
+        self.get_selector = get_selector  # the selector may be swapped (replay, soak)
+        self.bootstrap = bootstrap        # async (connection, profile) -> None
+        self.ttl = ttl
+        self.enabled = enabled
+        self._pending = {}
+
+    def prepare(self, call_sid, profile):
+        """Record the answer time and start warming an upstream session."""
+        if call_sid in self._pending:
+            return
+        pending = self._pending[call_sid] = _Pending(time.monotonic())
+        if self.enabled:
+            pending.task = asyncio.create_task(self._open(call_sid, pending, profile),
+                                               name=f"warm-upstream[{call_sid}]")
+        pending.expiry = asyncio.create_task(self._expire(call_sid, pending), name=f"warm-expiry[{call_sid}]")
+
+    async def _open(self, call_sid, pending, profile):
+        started = time.perf_counter()
+        try:
+            pending.connection = await pending.stack.enter_async_context(
+                self.get_selector().connect(model=profile.get('model')))
+            await self.bootstrap(pending.connection, profile)
+        except Exception as e:
+            # Counted here so warm-ups that fail and are never claimed show up too
+            logger.warning(f"Warm-up for {call_sid} failed: {e!r}")
+            metrics.inc('warmup.failed')
+            raise
+        metrics.observe('warmup.ready_ms', (time.perf_counter() - started) * 1000)
+
+    async def _expire(self, call_sid, pending):
+        await asyncio.sleep(self.ttl)
+        if self._pending.get(call_sid) is pending:
+            del self._pending[call_sid]
+            metrics.inc('warmup.expired')
+            logger.info(f"Closing unclaimed warm session for {call_sid}")
+            await self._discard(pending)
+
+    async def _discard(self, pending):
+        if pending.task is not None:
+            pending.task.cancel()  # no-op when already done
+            # Also retrieves a failed warm-up's exception, which nobody else will
+            await asyncio.gather(pending.task, return_exceptions=True)
+        await pending.stack.aclose()
+
+    @asynccontextmanager
+    async def connect(self, call_sid, model=None):
+        """Yield a ``WarmSession`` for the call, warm when one was prepared."""
+        pending = self._pending.pop(call_sid, None)
+        answered_at = pending.answered_at if pending else None
+        if pending is not None:
+            pending.expiry.cancel()
+        if pending is not None and pending.task is not None:
+            try:
+                await pending.task
+            except asyncio.CancelledError:
+                await pending.stack.aclose()
+                raise
+            except Exception:
+                logger.info(f"Connecting cold for {call_sid} after the failed warm-up")
+                await pending.stack.aclose()
+            else:
+                metrics.inc('warmup.claimed')
+                async with pending.stack:
+                    yield WarmSession(pending.connection, warmed=True, answered_at=answered_at)
+                return
+        async with self.get_selector().connect(model=model) as connection:
+            yield WarmSession(connection, answered_at=answered_at)
+
+    async def discard(self, call_sid):
+        """Close the warm session for a call that will not be bridged."""
+        pending = self._pending.pop(call_sid, None)
+        if pending is not None:
+            pending.expiry.cancel()
+            await self._discard(pending)
+
+    async def stop(self):
+        pending, self._pending = list(self._pending.values()), {}
+        for entry in pending:
+            entry.expiry.cancel()
+            await self._discard(entry)